@@ -0,0 +1,303 @@
+"""
+Benchmark suite for denoise.denoise_image.
+
+Generates synthetic noisy images at several sizes and times the OpenCV path,
+the NumPy fallback and different worker counts. Every case runs in a fresh
+subprocess so pool start-up, backend selection and peak memory are isolated.
+Results are written as JSON; --compare checks them against a stored baseline.
+
+Examples:
+    python bench_denoise.py --output baseline.json
+    python bench_denoise.py --sizes 2,12 --workers 1,4 --compare baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_SIZES_MP = "2,8,24,50"
+DEFAULT_BACKENDS = "opencv,fallback"
+DEFAULT_THRESHOLD = 0.10
+
+# Rows of the synthetic image generated at a time, to keep its float temporaries small
+SYNTHETIC_BLOCK_ROWS = 256
+
+# Seconds between RSS samples during the timed runs
+RSS_SAMPLE_INTERVAL = 0.005
+
+
+def synthetic_image(megapixels, seed=0):
+    """
+    Build a reproducible 3:2 RGB image: smooth gradients plus Gaussian noise.
+    It is generated in blocks of rows straight into uint8, so building it
+    does not set the process's memory peak.
+    """
+    import numpy as np
+    from PIL import Image
+
+    width = int(round((megapixels * 1e6 * 1.5) ** 0.5))
+    height = int(round(megapixels * 1e6 / width))
+    rng = np.random.default_rng(seed)
+    arr = np.empty((height, width, 3), dtype=np.uint8)
+    xx = np.arange(width, dtype=np.float32)[None, :]
+    for y0 in range(0, height, SYNTHETIC_BLOCK_ROWS):
+        y1 = min(height, y0 + SYNTHETIC_BLOCK_ROWS)
+        yy = np.arange(y0, y1, dtype=np.float32)[:, None]
+        block = np.empty((y1 - y0, width, 3), dtype=np.float32)
+        block[..., 0] = 128 + 80 * np.sin(xx / 97.0)
+        block[..., 1] = 128 + 80 * np.cos(yy / 61.0)
+        block[..., 2] = 255 * (xx + yy) / (width + height)
+        block += rng.standard_normal(block.shape, dtype=np.float32) * 18.0
+        np.clip(block, 0, 255, out=block)
+        arr[y0:y1] = block
+    return Image.fromarray(arr)
+
+
+def peak_rss_mb(who):
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def current_rss_mb():
+    """
+    Resident memory of this process right now, or None where /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RSSSampler:
+    """
+    Samples current_rss_mb() on a background thread while in use; peak_mb
+    is the highest value seen. Unlike ru_maxrss it only covers the code
+    run inside the with block.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def __enter__(self):
+        if self.peak_mb is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.peak_mb is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+def worker_peak_rss_mb(_):
+    # Runs inside a pool worker; the short sleep spreads the calls over all workers
+    time.sleep(0.05)
+    return peak_rss_mb(resource.RUSAGE_SELF)
+
+
+def run_case(args):
+    """
+    Time one (backend, size, workers) case in this process and print JSON.
+    """
+    import denoise
+
+    if args.backend == "opencv" and denoise.cv2 is None:
+        print(json.dumps({"skipped": "OpenCV not available"}))
+        return
+
+    denoise.configure_pool(args.case_workers)
+    # Warm up so the pool start-up is not part of the timings
+    denoise.denoise_image(synthetic_image(0.05), radius=args.radius, tolerance=args.tolerance)
+
+    img = synthetic_image(args.case_size)
+    megapixels = img.size[0] * img.size[1] / 1e6
+    times = []
+    rss_before = current_rss_mb()
+    with RSSSampler() as sampler:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            denoise.denoise_image(img, radius=args.radius, tolerance=args.tolerance, mix=1.0, mode=args.mode)
+            times.append(time.perf_counter() - start)
+    if sampler.peak_mb is None:
+        # No /proc: fall back to the lifetime peak, which includes building the image
+        rss_before, peak_rss = None, peak_rss_mb(resource.RUSAGE_SELF)
+    else:
+        peak_rss = sampler.peak_mb
+    # Pool workers are children of the fork server, so ask them directly
+    worker_rss = denoise.get_pool().map(worker_peak_rss_mb, range(4 * args.case_workers), chunksize=1)
+    denoise.shutdown_pool()
+
+    seconds = statistics.median(times)
+    print(json.dumps({
+        "megapixels": round(megapixels, 3),
+        "seconds": seconds,
+        "seconds_all": times,
+        "mp_per_s": megapixels / seconds,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss,
+        "peak_rss_increase_mb": None if rss_before is None else peak_rss - rss_before,
+        "peak_worker_rss_mb": max(worker_rss),
+    }))
+
+
+def spawn_case(args, backend, size, workers):
+    env = dict(os.environ)
+    if backend == "fallback":
+        env["DENOISE_NO_OPENCV"] = "1"
+    else:
+        env.pop("DENOISE_NO_OPENCV", None)
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--run-case",
+        "--backend", backend,
+        "--case-size", str(size),
+        "--case-workers", str(workers),
+        "--radius", str(args.radius),
+        "--tolerance", str(args.tolerance),
+        "--mode", args.mode,
+        "--repeat", str(args.repeat),
+    ]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def add_parallel_efficiency(results):
+    """
+    Efficiency of each case relative to the 1-worker run of the same backend
+    and size: t(1) / (workers * t(workers)).
+    """
+    single = {
+        (r["backend"], r["size_mp"]): r["seconds"]
+        for r in results if r["workers"] == 1 and "seconds" in r
+    }
+    for r in results:
+        base = single.get((r["backend"], r["size_mp"]))
+        if base is not None and "seconds" in r:
+            r["speedup"] = base / r["seconds"]
+            r["parallel_efficiency"] = base / (r["workers"] * r["seconds"])
+
+
+def case_key(r):
+    return (r["backend"], r["size_mp"], r["workers"], r.get("mode", "color"))
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare throughput with a baseline report. Returns the list of regressions.
+    """
+    old = {case_key(r): r for r in baseline["results"] if "mp_per_s" in r}
+    regressions = []
+    for r in results:
+        b = old.get(case_key(r))
+        if b is None or "mp_per_s" not in r:
+            continue
+        ratio = r["mp_per_s"] / b["mp_per_s"]
+        r["baseline_mp_per_s"] = b["mp_per_s"]
+        r["ratio_vs_baseline"] = ratio
+        if ratio < 1.0 - threshold:
+            regressions.append(r)
+    return regressions
+
+
+def parse_list(text, cast):
+    return [cast(v) for v in text.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark denoise.denoise_image throughput and scaling.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES_MP,
+                        help="comma-separated image sizes in megapixels (default: %(default)s)")
+    parser.add_argument("--workers", default=None,
+                        help="comma-separated worker counts (default: 1, powers of two, all CPUs)")
+    parser.add_argument("--backends", default=DEFAULT_BACKENDS,
+                        help="comma-separated subset of opencv,fallback (default: %(default)s)")
+    parser.add_argument("--radius", type=int, default=2)
+    parser.add_argument("--tolerance", type=float, default=10)
+    parser.add_argument("--mode", default="color", help="denoise mode (color, luma, luma_chroma)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case; the median is reported")
+    parser.add_argument("--output", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed throughput drop before a case counts as a regression (default: %(default)s)")
+    # Internal: run a single case in this process
+    parser.add_argument("--run-case", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--case-size", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--case-workers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case(args)
+        return 0
+
+    cpus = os.cpu_count() or 1
+    if args.workers:
+        workers_list = parse_list(args.workers, int)
+    else:
+        workers_list = sorted({1, cpus} | {2 ** i for i in range(1, cpus.bit_length()) if 2 ** i < cpus})
+
+    results = []
+    for backend in parse_list(args.backends, str):
+        for size in parse_list(args.sizes, float):
+            for workers in workers_list:
+                print(f"{backend:8s} {size:6.1f} MP  {workers:3d} workers ...", file=sys.stderr, end=" ", flush=True)
+                outcome = spawn_case(args, backend, size, workers)
+                outcome.update({"backend": backend, "size_mp": size, "workers": workers, "mode": args.mode})
+                results.append(outcome)
+                if "mp_per_s" in outcome:
+                    print(f"{outcome['mp_per_s']:.2f} MP/s", file=sys.stderr)
+                else:
+                    print(outcome.get("skipped") or outcome.get("error"), file=sys.stderr)
+
+    add_parallel_efficiency(results)
+    report = {
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpus": cpus,
+        },
+        "params": {"radius": args.radius, "tolerance": args.tolerance, "mode": args.mode, "repeat": args.repeat},
+        "results": results,
+    }
+
+    status = 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = [case_key(r) for r in regressions]
+        for r in regressions:
+            print(f"REGRESSION {case_key(r)}: {r['mp_per_s']:.2f} MP/s vs "
+                  f"{r['baseline_mp_per_s']:.2f} MP/s baseline", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
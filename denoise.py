@@ -1,73 +1,651 @@
+import os
+import sys
+import time
+import argparse
 import numpy as np
-from PIL import Image
-import cv2
+from PIL import Image, ImageOps
 import multiprocessing
-import colorsys
+from multiprocessing import shared_memory
+import threading
+import itertools
+import queue
+import atexit
+
+from cache import ByteLRUCache, image_nbytes
+
+# Attempt OpenCV import (DENOISE_NO_OPENCV=1 forces the NumPy fallback)
+if os.environ.get("DENOISE_NO_OPENCV"):
+    cv2 = None
+else:
+    try:
+        import cv2
+    except ImportError:
+        cv2 = None  # fallback if not available
+
+# Long-lived worker pool shared by every denoise call.
+# "forkserver" (or "spawn" where it is not available) is used instead of
+# "fork" because denoise_image is called from the app's background threads,
+# and forking a multi-threaded process is not safe.
+_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_pool = None
+_pool_size = None
+_pool_lock = threading.Lock()
+
+def pool_size():
+    """
+    Number of worker processes the shared pool runs with.
+    """
+    return _pool_size or multiprocessing.cpu_count()
+
+def configure_pool(processes=None):
+    """
+    Set the number of worker processes (None means one per CPU).
+    A running pool is shut down and restarted lazily with the new size.
+    """
+    global _pool_size
+    shutdown_pool()
+    _pool_size = processes
+
+def get_pool():
+    """
+    Return the shared worker pool, starting it on first use.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            ctx = multiprocessing.get_context(_START_METHOD)
+            _pool = ctx.Pool(processes=pool_size())
+        return _pool
+
+def shutdown_pool():
+    """
+    Close the shared worker pool and wait for its workers to exit.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool.join()
+            _pool = None
+
+atexit.register(shutdown_pool)
+
+# Tile scheduling
+TEMPLATE_WINDOW = 7
+TILE_MIN_SIZE = 64
+TILE_HALO_FACTOR = 16
+TILES_PER_WORKER = 8
+TILES_IN_FLIGHT_PER_WORKER = 2
+
+# Modes with one byte per channel, whose raw bytes can go straight into a NumPy uint8 buffer
+UINT8_MODES = ("L", "LA", "P", "RGB", "RGBA", "CMYK", "YCbCr")
+# Rows copied at a time when filling the shared input buffer
+COPY_STRIP_ROWS = 256
+
+# Denoise modes, see denoise_segment
+DENOISE_MODES = ("color", "luma", "luma_chroma")
+
+# Algorithms for the non-OpenCV fallback, see denoise_segment
+FALLBACK_ALGORITHMS = ("window", "histogram")
+HISTOGRAM_LEVELS = 64
+
+# Denoised preview bases, see denoise_preview
+PREVIEW_CACHE_BYTES = 512 * 1024 * 1024
+preview_cache = ByteLRUCache(PREVIEW_CACHE_BYTES)
+
+class DenoiseCancelled(Exception):
+    """
+    Raised by denoise_image when its cancelled() callback asks it to stop.
+    """
 
 def denoise_segment(segment_data):
     """
     Denoise a segment of the image.
+    mode is one of DENOISE_MODES:
+      "color"       - non-local means on luma and chroma (Lab inside OpenCV)
+      "luma"        - non-local means on the Y plane of YCrCb only
+      "luma_chroma" - as "luma", plus a box blur of the Cr/Cb planes
+    Without OpenCV, fallback picks one of FALLBACK_ALGORITHMS:
+      "window"    - tolerance_filter, cost grows with (2*radius+1)^2
+      "histogram" - histogram_filter, cost independent of radius
     """
-    segment, radius, tolerance, mix = segment_data
-    height, width, channels = segment.shape
-    result = segment.copy()
+    segment, radius, tolerance, mix, mode, fallback = segment_data
 
     if cv2 is not None:
         # OpenCV denoising
-        bgr = cv2.cvtColor(segment, cv2.COLOR_RGB2BGR)
         h = float(tolerance)
         hColor = float(tolerance)
         search_window = max(3, radius*2+1)
-        template_window = 7
-        denoised = cv2.fastNlMeansDenoisingColored(
-            bgr,
-            None,
-            h, hColor,
-            template_window,
-            search_window
-        )
-        rgb = cv2.cvtColor(denoised, cv2.COLOR_BGR2RGB)
+        template_window = TEMPLATE_WINDOW
+        if mode == "color":
+            bgr = cv2.cvtColor(segment, cv2.COLOR_RGB2BGR)
+            denoised = cv2.fastNlMeansDenoisingColored(
+                bgr,
+                None,
+                h, hColor,
+                template_window,
+                search_window
+            )
+            rgb = cv2.cvtColor(denoised, cv2.COLOR_BGR2RGB)
+        else:
+            y, cr, cb = cv2.split(cv2.cvtColor(segment, cv2.COLOR_RGB2YCrCb))
+            y = cv2.fastNlMeansDenoising(y, None, h, template_window, search_window)
+            if mode == "luma_chroma":
+                # Chroma noise is low-frequency; a box blur inside the halo is enough
+                cr = cv2.blur(cr, (search_window, search_window))
+                cb = cv2.blur(cb, (search_window, search_window))
+            rgb = cv2.cvtColor(cv2.merge((y, cr, cb)), cv2.COLOR_YCrCb2RGB)
         # Blend with original
         out = (1.0 - mix)*segment.astype(np.float32) + mix*rgb.astype(np.float32)
         out = np.clip(out, 0, 255).astype(np.uint8)
         return out
     else:
-        # Fallback to a simple average filter
-        for y in range(height):
-            for x in range(width):
-                accum_l = 0.0
-                count = 0
-                r, g, b = segment[y, x, :3]
-                h_main, l_main, s_main = colorsys.rgb_to_hls(r/255.0, g/255.0, b/255.0)
-                for ny in range(max(0, y - radius), min(height, y + radius + 1)):
-                    for nx in range(max(0, x - radius), min(width, x + radius + 1)):
-                        rr, gg, bb = segment[ny, nx, :3]
-                        h_n, l_n, s_n = colorsys.rgb_to_hls(rr/255.0, gg/255.0, bb/255.0)
-                        if abs(l_n - l_main)*100 <= tolerance:
-                            accum_l += l_n
-                            count += 1
-                if count > 0:
-                    avg_l = accum_l / count
-                    new_l = l_main + mix * (avg_l - l_main)
-                    r_new, g_new, b_new = colorsys.hls_to_rgb(h_main, new_l, s_main)
-                    result[y, x, 0] = int(r_new * 255)
-                    result[y, x, 1] = int(g_new * 255)
-                    result[y, x, 2] = int(b_new * 255)
-        return result
-
-def denoise_image(pil_img, radius=2, tolerance=10, mix=1.0):
+        # Fallback to a tolerance-limited average of the lightness channel,
+        # which is already luma-only whatever the mode
+        if fallback == "histogram":
+            return histogram_filter(segment, radius, tolerance, mix)
+        return tolerance_filter(segment, radius, tolerance, mix)
+
+def rgb_to_hls_array(rgb):
+    """
+    Vectorized colorsys.rgb_to_hls over an (..., 3) float array in [0, 1].
+    Returns the h, l and s planes.
+    """
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = np.maximum(np.maximum(r, g), b)
+    minc = np.minimum(np.minimum(r, g), b)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0
+    gray = rangec == 0
+    safe_range = np.where(gray, 1.0, rangec)
+
+    s = np.where(l <= 0.5, rangec / np.where(gray, 1.0, sumc), rangec / np.where(gray, 1.0, 2.0 - maxc - minc))
+    rc = (maxc - r) / safe_range
+    gc = (maxc - g) / safe_range
+    bc = (maxc - b) / safe_range
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    h = (h / 6.0) % 1.0
+
+    h[gray] = 0.0
+    s[gray] = 0.0
+    return h, l, s
+
+def hls_to_rgb_array(h, l, s):
+    """
+    Vectorized colorsys.hls_to_rgb. Returns an (..., 3) float array in [0, 1].
+    """
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+
+    def channel(hue):
+        hue = hue % 1.0
+        return np.where(hue < 1.0/6.0, m1 + (m2 - m1) * hue * 6.0,
+               np.where(hue < 0.5, m2,
+               np.where(hue < 2.0/3.0, m1 + (m2 - m1) * (2.0/3.0 - hue) * 6.0, m1)))
+
+    rgb = np.stack([channel(h + 1.0/3.0), channel(h), channel(h - 1.0/3.0)], axis=-1)
+    gray = s == 0.0
+    rgb[gray] = l[gray][:, None]
+    return rgb
+
+def tolerance_filter(segment, radius, tolerance, mix):
+    """
+    Replace each pixel's HLS lightness with the mean lightness of the
+    neighbours within radius whose lightness differs by at most
+    tolerance percent, blended by mix. Hue and saturation are kept.
+    """
+    result = segment.copy()
+    h, l, s = rgb_to_hls_array(segment[..., :3].astype(np.float64) / 255.0)
+    height, width = l.shape
+
+    # NaN padding drops out-of-frame neighbours, like the clamped window did
+    padded = np.pad(l, radius, mode="constant", constant_values=np.nan)
+    accum_l = np.zeros_like(l)
+    count = np.zeros_like(l)
+    for dy in range(2*radius + 1):
+        for dx in range(2*radius + 1):
+            l_n = padded[dy:dy + height, dx:dx + width]
+            mask = np.abs(l_n - l)*100 <= tolerance
+            accum_l += np.where(mask, l_n, 0.0)
+            count += mask
+
+    avg_l = accum_l / np.maximum(count, 1)
+    new_l = np.where(count > 0, l + mix * (avg_l - l), l)
+    rgb = hls_to_rgb_array(h, new_l, s)
+    result[..., :3] = (rgb * 255).astype(np.uint8)
+    return result
+
+def box_sum(plane, radius):
+    """
+    Sum of plane over the (2*radius+1)^2 window around each pixel, clamped
+    to the frame, computed from cumulative sums in constant time.
+    """
+    out = np.asarray(plane, dtype=np.float64)
+    for _ in range(2):
+        # Cumulative sum with a leading zero, edge-padded so that slicing
+        # gives c[min(i+r+1, n)] - c[max(i-r, 0)]; then repeat on the other axis
+        n = out.shape[0]
+        c = np.zeros((n + 1,) + out.shape[1:])
+        np.cumsum(out, axis=0, out=c[1:])
+        c = np.pad(c, ((radius, radius), (0, 0)), mode="edge")
+        out = (c[2*radius + 1:2*radius + 1 + n] - c[:n]).T
+    return out
+
+def histogram_filter(segment, radius, tolerance, mix, levels=HISTOGRAM_LEVELS):
+    """
+    Radius-independent variant of tolerance_filter.
+    Lightness is quantized into levels bins. For each bin, box_sum gives the
+    count and lightness sum of the neighbours in that bin, and running
+    totals over the bins give every pixel its range-restricted mean. Cost is
+    O(levels) per pixel whatever the radius. Neighbours are admitted by
+    whole bins, so the result is approximate; with levels=511 it only
+    differs from tolerance_filter for neighbours lying exactly on the
+    tolerance boundary, which the float comparison there admits or not.
+    """
+    result = segment.copy()
+    rgb = segment[..., :3]
+    h, l, s = rgb_to_hls_array(rgb.astype(np.float64) / 255.0)
+
+    # l = (max + min) / 510, so max + min is an exact integer lightness in 0..510
+    sumc = rgb.max(axis=-1).astype(np.int32) + rgb.min(axis=-1)
+    reach = tolerance * 5.1
+    bins = sumc * levels // 511
+    lo_bin = np.clip(np.ceil(sumc - reach), 0, 510).astype(np.int32) * levels // 511
+    hi_bin = np.clip(np.floor(sumc + reach), 0, 510).astype(np.int32) * levels // 511
+
+    # Pixels grouped by the bins where their running totals must be sampled
+    flat_lo = lo_bin.ravel() - 1
+    flat_hi = hi_bin.ravel()
+    order_lo = np.argsort(flat_lo, kind="stable")
+    order_hi = np.argsort(flat_hi, kind="stable")
+    sorted_lo = flat_lo[order_lo]
+    sorted_hi = flat_hi[order_hi]
+
+    below_count = np.zeros(l.size)
+    below_sum = np.zeros(l.size)
+    upto_count = np.zeros(l.size)
+    upto_sum = np.zeros(l.size)
+    running_count = np.zeros(l.shape)
+    running_sum = np.zeros(l.shape)
+    for k in range(int(lo_bin.min()), int(hi_bin.max()) + 1):
+        in_bin = bins == k
+        if in_bin.any():
+            running_count += box_sum(in_bin, radius)
+            running_sum += box_sum(np.where(in_bin, l, 0.0), radius)
+        flat_count = running_count.ravel()
+        flat_sum = running_sum.ravel()
+        idx = order_lo[np.searchsorted(sorted_lo, k):np.searchsorted(sorted_lo, k, side="right")]
+        below_count[idx] = flat_count[idx]
+        below_sum[idx] = flat_sum[idx]
+        idx = order_hi[np.searchsorted(sorted_hi, k):np.searchsorted(sorted_hi, k, side="right")]
+        upto_count[idx] = flat_count[idx]
+        upto_sum[idx] = flat_sum[idx]
+
+    count = (upto_count - below_count).reshape(l.shape)
+    accum_l = (upto_sum - below_sum).reshape(l.shape)
+    avg_l = accum_l / np.maximum(count, 1)
+    new_l = np.where(count > 0.5, l + mix * (avg_l - l), l)
+    rgb_out = hls_to_rgb_array(h, np.clip(new_l, 0.0, 1.0), s)
+    result[..., :3] = (rgb_out * 255).astype(np.uint8)
+    return result
+
+def tile_halo(radius):
+    """
+    Number of context pixels a tile needs on each side so that the
+    search and template windows are never truncated at tile borders.
+    """
+    if cv2 is not None:
+        search_window = max(3, radius*2+1)
+        return search_window // 2 + TEMPLATE_WINDOW // 2
+    return radius
+
+def plan_tiles(height, width, radius, num_workers):
+    """
+    Split a height x width frame into tiles for the worker pool.
+    Returns a list of (y0, y1, x0, x1) core regions; the halo is added later.
+    """
+    halo = tile_halo(radius)
+    # Tiles are a multiple of the window footprint so the halo overhead stays small
+    tile = max(TILE_MIN_SIZE, TILE_HALO_FACTOR * (2*halo + 1))
+    # Make sure there are several tiles per worker so fast workers can pick up more
+    while tile > TILE_MIN_SIZE and \
+            -(-height // tile) * -(-width // tile) < TILES_PER_WORKER * num_workers:
+        tile = max(TILE_MIN_SIZE, tile // 2)
+
+    tiles = []
+    for y0 in range(0, height, tile):
+        for x0 in range(0, width, tile):
+            tiles.append((y0, min(y0 + tile, height), x0, min(x0 + tile, width)))
+    return tiles
+
+def denoise_tile(tile_data):
+    """
+    Denoise one tile in place. The worker reads the tile plus its halo
+    from the shared input buffer and writes only the core region into the
+    shared output buffer, so just coordinates travel through the pipe.
+    """
+    (in_name, out_name, shape, dtype), (y0, y1, x0, x1), (py0, py1, px0, px1), \
+        radius, tolerance, mix, mode, fallback = tile_data
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        src = np.ndarray(shape, dtype=dtype, buffer=in_shm.buf)
+        dst = np.ndarray(shape, dtype=dtype, buffer=out_shm.buf)
+        out = denoise_segment((src[py0:py1, px0:px1], radius, tolerance, mix, mode, fallback))
+        dst[y0:y1, x0:x1] = out[y0 - py0:y1 - py0, x0 - px0:x1 - px0]
+        # Views must be released before the segments can be closed
+        del src, dst
+    finally:
+        in_shm.close()
+        out_shm.close()
+    return y0, y1, x0, x1
+
+def copy_into_buffer(pil_img, buf):
+    """
+    Write the raw pixels of pil_img into buf a strip of rows at a time, so
+    no full-frame copy is made on the way (np.asarray goes through tobytes()).
+    """
+    width, height = pil_img.size
+    offset = 0
+    for y0 in range(0, height, COPY_STRIP_ROWS):
+        strip = pil_img.crop((0, y0, width, min(height, y0 + COPY_STRIP_ROWS))).tobytes()
+        buf[offset:offset + len(strip)] = strip
+        offset += len(strip)
+
+def denoise_image(pil_img, radius=2, tolerance=10, mix=1.0, cancelled=None, mode="color",
+                  fallback="window"):
     """
     Denoise the given PIL image using multiprocessing.
+    The frame is split into 2D tiles padded with a halo, dispatched
+    dynamically to the shared pool and cropped back on reassembly.
+    Pixels are exchanged through shared memory rather than pickled.
+    If cancelled() becomes true, no more tiles are dispatched and
+    DenoiseCancelled is raised once the in-flight ones finish.
+    See denoise_segment for the available modes and fallback algorithms.
+    """
+    width, height = pil_img.size
+    if pil_img.mode in UINT8_MODES:
+        arr = None
+        bands = len(pil_img.getbands())
+        shape = (height, width) if bands == 1 else (height, width, bands)
+        dtype = np.dtype(np.uint8)
+    else:
+        arr = np.asarray(pil_img)
+        shape, dtype = arr.shape, arr.dtype
+    pool = get_pool()
+    halo = tile_halo(radius)
+
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    in_shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+    try:
+        try:
+            if arr is None:
+                copy_into_buffer(pil_img, in_shm.buf)
+            else:
+                np.ndarray(shape, dtype=dtype, buffer=in_shm.buf)[...] = arr
+                del arr
+            buffers = (in_shm.name, out_shm.name, shape, dtype.str)
+
+            def tile_tasks():
+                for y0, y1, x0, x1 in plan_tiles(height, width, radius, pool_size()):
+                    py0, py1 = max(0, y0 - halo), min(height, y1 + halo)
+                    px0, px1 = max(0, x0 - halo), min(width, x1 + halo)
+                    yield buffers, (y0, y1, x0, x1), (py0, py1, px0, px1), radius, tolerance, mix, mode, fallback
+
+            # Keep a bounded number of tiles in flight and hand out the next one as
+            # soon as any finishes, so a cancelled render stops using the workers
+            done = queue.Queue()
+            tasks = tile_tasks()
+            in_flight = 0
+            error = None
+            for task in itertools.islice(tasks, TILES_IN_FLIGHT_PER_WORKER * pool_size()):
+                pool.apply_async(denoise_tile, (task,), callback=done.put, error_callback=done.put)
+                in_flight += 1
+            while in_flight:
+                result = done.get()
+                in_flight -= 1
+                if isinstance(result, BaseException):
+                    error = error or result
+                elif cancelled is not None and cancelled():
+                    error = error or DenoiseCancelled()
+                if error is None:
+                    task = next(tasks, None)
+                    if task is not None:
+                        pool.apply_async(denoise_tile, (task,), callback=done.put, error_callback=done.put)
+                        in_flight += 1
+            if error is not None:
+                raise error
+        finally:
+            # Free the input before the result is allocated, so at most two frames are held
+            in_shm.close()
+            in_shm.unlink()
+
+        # Decode straight from the shared output into a new image (single copy)
+        with out_shm.buf[:nbytes] as view:
+            denoised_img = Image.frombytes(pil_img.mode, pil_img.size, view)
+    finally:
+        out_shm.close()
+        out_shm.unlink()
+
+    return denoised_img
+
+def blend_mix(source, denoised, mix):
+    """
+    Blend a fully denoised image over its source, as the mix parameter does.
     """
-    arr = np.array(pil_img)
-    height, width = arr.shape[:2]
-    num_cores = multiprocessing.cpu_count()
-    # Split the image vertically into segments
-    segments = np.array_split(arr, num_cores, axis=0)
-    segment_data = [(segment, radius, tolerance, mix) for segment in segments]
+    if mix >= 1.0:
+        return denoised
+    if mix <= 0.0:
+        return source
+    out = (1.0 - mix)*np.asarray(source, dtype=np.float32) + mix*np.asarray(denoised, dtype=np.float32)
+    out = np.clip(out, 0, 255).astype(np.uint8)
+    return Image.fromarray(out, mode=source.mode)
+
+def denoise_preview(pil_img, scale, radius=2, tolerance=10, mix=1.0, cancelled=None, cache_key=None,
+                    mode="color", fallback="window", filter_scale=None):
+    """
+    Denoise a downscaled proxy of the image for on-screen preview.
+    scale is the displayed resolution relative to pil_img; the proxy is
+    pil_img itself when scale >= 1. Radius and tolerance are scaled by
+    filter_scale, the displayed resolution relative to the image the
+    parameters were chosen for (scale by default), since box-downscaling
+    shrinks both feature sizes and the noise standard deviation by that
+    factor. Pass it when pil_img is itself a reduced decode.
+
+    When cache_key identifies pil_img (e.g. path and exposure), the fully
+    denoised base is kept in preview_cache and mix is applied on top as a
+    blend, so repeating a preview or changing only mix is immediate.
+    """
+    if filter_scale is None:
+        filter_scale = scale
+    key = None if cache_key is None else (cache_key, scale, filter_scale, radius, tolerance, mode, fallback)
+    entry = preview_cache.get(key) if key is not None else None
+
+    if entry is None:
+        if scale >= 1.0:
+            proxy = pil_img
+        else:
+            w, h = pil_img.size
+            proxy_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+            proxy = pil_img.resize(proxy_size, Image.Resampling.BOX)
+        if filter_scale >= 1.0:
+            proxy_radius, proxy_tolerance = radius, tolerance
+        else:
+            proxy_radius = max(1, round(radius * filter_scale)) if radius > 0 else 0
+            proxy_tolerance = tolerance * filter_scale
+
+        if key is None:
+            return denoise_image(proxy, radius=proxy_radius, tolerance=proxy_tolerance, mix=mix,
+                                 cancelled=cancelled, mode=mode, fallback=fallback)
+
+        base = denoise_image(proxy, radius=proxy_radius, tolerance=proxy_tolerance, mix=1.0,
+                             cancelled=cancelled, mode=mode, fallback=fallback)
+        entry = (proxy, base)
+        preview_cache.put(key, entry, image_nbytes(proxy) + image_nbytes(base))
+
+    proxy, base = entry
+    return blend_mix(proxy, base, mix)
+
+# -------------------------
+# Batch processing (command line)
+# -------------------------
+BATCH_EXTENSIONS = ('.jpg', '.jpeg')
+BATCH_QUEUE_SIZE = 2
+
+def batch_denoise(input_dir, output_dir, radius=2, tolerance=10, mix=1.0, mode="color",
+                  fallback="window", quality=95, io_threads=2, denoise_threads=2, log=None):
+    """
+    Denoise every JPEG in input_dir into output_dir.
+
+    Images stream through a bounded decode -> denoise -> encode pipeline:
+    decode and encode threads overlap file I/O and JPEG coding with the
+    denoise of other images, and more than one image is denoised at a time
+    so the worker pool does not drain between frames. Outputs are written
+    to a temporary name and renamed when complete, and existing outputs are
+    skipped, so an interrupted run resumes where it stopped.
+    Returns a dict with counts, elapsed seconds and megapixels processed.
+    """
+    log = log or (lambda message: print(message, file=sys.stderr, flush=True))
+    os.makedirs(output_dir, exist_ok=True)
+
+    names = sorted(f for f in os.listdir(input_dir) if f.lower().endswith(BATCH_EXTENSIONS))
+    todo = [f for f in names if not os.path.exists(os.path.join(output_dir, f))]
+    stats = {"total": len(names), "skipped": len(names) - len(todo), "done": 0, "failed": 0, "megapixels": 0.0}
+    if stats["skipped"]:
+        log(f"Skipping {stats['skipped']} image(s) already present in '{output_dir}'.")
+    if not todo:
+        stats["seconds"] = 0.0
+        return stats
+
+    pending = queue.Queue()
+    for name in todo:
+        pending.put(name)
+    decoded = queue.Queue(maxsize=BATCH_QUEUE_SIZE)
+    denoised = queue.Queue(maxsize=BATCH_QUEUE_SIZE)
+    stats_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def fail(name, stage, error):
+        with stats_lock:
+            stats["failed"] += 1
+        log(f"Failed to {stage} '{name}': {error}")
+
+    def decode_worker():
+        while True:
+            try:
+                name = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                with Image.open(os.path.join(input_dir, name)) as img:
+                    exif = img.info.get("exif")
+                    img = ImageOps.exif_transpose(img).convert("RGB")
+                decoded.put((name, img, exif))
+            except Exception as e:
+                fail(name, "decode", e)
+
+    def denoise_worker():
+        while True:
+            item = decoded.get()
+            if item is None:
+                return
+            name, img, exif = item
+            try:
+                out = denoise_image(img, radius=radius, tolerance=tolerance, mix=mix, mode=mode, fallback=fallback)
+                denoised.put((name, out, exif, img.size[0] * img.size[1] / 1e6))
+            except Exception as e:
+                fail(name, "denoise", e)
+
+    def encode_worker():
+        while True:
+            item = denoised.get()
+            if item is None:
+                return
+            name, img, exif, megapixels = item
+            final_path = os.path.join(output_dir, name)
+            part_path = os.path.join(output_dir, f".{name}.part")
+            try:
+                save_args = {"format": "JPEG", "quality": quality}
+                if exif:
+                    # exif_transpose already applied the orientation
+                    exif_data = Image.Exif()
+                    exif_data.load(exif)
+                    exif_data.pop(0x0112, None)
+                    save_args["exif"] = exif_data.tobytes()
+                img.save(part_path, **save_args)
+                os.replace(part_path, final_path)
+            except Exception as e:
+                fail(name, "encode", e)
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                continue
+            with stats_lock:
+                stats["done"] += 1
+                stats["megapixels"] += megapixels
+                finished = stats["done"] + stats["failed"]
+                elapsed = time.perf_counter() - start
+                rate = stats["megapixels"] / elapsed if elapsed > 0 else 0.0
+                remaining = (len(todo) - finished) * elapsed / finished
+            log(f"[{finished}/{len(todo)}] {name}  {rate:.2f} MP/s  ETA {remaining:.0f} s")
+
+    def run_stage(target, count):
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(count)]
+        for t in threads:
+            t.start()
+        return threads
+
+    decoders = run_stage(decode_worker, io_threads)
+    denoisers = run_stage(denoise_worker, denoise_threads)
+    encoders = run_stage(encode_worker, io_threads)
+
+    # Shut the stages down in order with one sentinel per thread
+    for t in decoders:
+        t.join()
+    for _ in denoisers:
+        decoded.put(None)
+    for t in denoisers:
+        t.join()
+    for _ in encoders:
+        denoised.put(None)
+    for t in encoders:
+        t.join()
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Denoise every JPEG in a folder without the GUI.")
+    parser.add_argument("input", help="folder with the source JPEG files")
+    parser.add_argument("output", help="folder for the denoised files (created if missing)")
+    parser.add_argument("--radius", type=int, default=2)
+    parser.add_argument("--tolerance", type=float, default=10)
+    parser.add_argument("--mix", type=float, default=1.0)
+    parser.add_argument("--mode", choices=DENOISE_MODES, default="color")
+    parser.add_argument("--fallback", choices=FALLBACK_ALGORITHMS, default="window",
+                        help="algorithm used when OpenCV is not installed")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG quality of the output")
+    parser.add_argument("--workers", type=int, default=None, help="denoise processes (default: one per CPU)")
+    parser.add_argument("--io-threads", type=int, default=2, help="decode and encode threads each")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input):
+        parser.error(f"input folder not found: {args.input}")
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        parser.error("output folder must differ from the input folder")
 
-    with multiprocessing.Pool(processes=num_cores) as pool:
-        denoised_segments = pool.map(denoise_segment, segment_data)
+    configure_pool(args.workers)
+    stats = batch_denoise(
+        args.input, args.output,
+        radius=args.radius, tolerance=args.tolerance, mix=args.mix,
+        mode=args.mode, fallback=args.fallback, quality=args.quality,
+        io_threads=args.io_threads
+    )
+    rate = stats["megapixels"] / stats["seconds"] if stats["seconds"] else 0.0
+    print(f"Processed {stats['done']} image(s), skipped {stats['skipped']}, failed {stats['failed']} "
+          f"in {stats['seconds']:.1f} s ({rate:.2f} MP/s).", file=sys.stderr)
+    return 1 if stats["failed"] else 0
 
-    denoised_arr = np.vstack(denoised_segments)
-    return Image.fromarray(denoised_arr, mode=pil_img.mode)
+if __name__ == "__main__":
+    sys.exit(main())
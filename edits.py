@@ -0,0 +1,156 @@
+from PIL import Image
+
+import denoise
+from cache import image_nbytes
+
+# Order in which edits are applied; each stage works on the previous one's output
+EDIT_STAGES = ("orientation", "rotation", "crop", "exposure", "denoise", "resize")
+
+# EXIF Orientation value -> transpose that shows the image upright (as ImageOps.exif_transpose)
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# Quarter turns anticlockwise -> transpose
+ROTATION_TRANSPOSE = {
+    1: Image.Transpose.ROTATE_90,
+    2: Image.Transpose.ROTATE_180,
+    3: Image.Transpose.ROTATE_270,
+}
+
+
+def orient(pil_img, orientation, cancelled, input_key):
+    return pil_img.transpose(ORIENTATION_TRANSPOSE[orientation])
+
+
+def rotate(pil_img, steps, cancelled, input_key):
+    return pil_img.transpose(ROTATION_TRANSPOSE[steps])
+
+
+def crop(pil_img, box, cancelled, input_key):
+    """
+    box is (left, top, right, bottom) as fractions of the image size, so the
+    same crop applies to a proxy and to the full-resolution image.
+    """
+    w, h = pil_img.size
+    left, top, right, bottom = box
+    return pil_img.crop((left * w, top * h, right * w, bottom * h))
+
+
+def adjust_exposure(pil_img, factor, cancelled=None, input_key=None):
+    """
+    Multiply the colour channels by factor through a 256-entry lookup
+    table, which costs one table lookup per sample at any image size.
+    """
+    if factor == 1.0:
+        return pil_img
+    if pil_img.mode not in ("L", "LA", "RGB", "RGBA"):
+        pil_img = pil_img.convert("RGB")
+    lut = [min(255, int(round(i * factor))) for i in range(256)]
+    identity = list(range(256))
+    table = []
+    for band in pil_img.getbands():
+        table += identity if band == "A" else lut
+    return pil_img.point(table)
+
+
+def apply_denoise(pil_img, params, cancelled, input_key):
+    """
+    params is (radius, tolerance, mix, mode, fallback, preview_scale,
+    filter_scale). With a preview_scale the image is denoised as a proxy at
+    that scale, with radius and tolerance scaled by filter_scale (the
+    preview's resolution relative to the full-size image), and the denoised
+    base is cached under input_key; without one (export) the whole image is
+    denoised at full resolution.
+    """
+    radius, tolerance, mix, mode, fallback, preview_scale, filter_scale = params
+    if preview_scale is None:
+        return denoise.denoise_image(pil_img, radius=radius, tolerance=tolerance, mix=mix,
+                                     cancelled=cancelled, mode=mode, fallback=fallback)
+    return denoise.denoise_preview(pil_img, preview_scale, radius=radius, tolerance=tolerance, mix=mix,
+                                   cancelled=cancelled, cache_key=input_key, mode=mode, fallback=fallback,
+                                   filter_scale=filter_scale)
+
+
+def resize(pil_img, size, cancelled, input_key):
+    return pil_img.resize(size, Image.Resampling.LANCZOS)
+
+
+STAGE_FUNCTIONS = {
+    "orientation": orient,
+    "rotation": rotate,
+    "crop": crop,
+    "exposure": adjust_exposure,
+    "denoise": apply_denoise,
+    "resize": resize,
+}
+
+
+class EditPipeline:
+    """
+    Non-destructive edit graph: orientation -> rotation -> crop -> exposure
+    -> denoise -> resize, applied to a source image that is never modified.
+
+    Edits are given as a dict of stage name -> parameters, with None (or a
+    missing entry) skipping the stage. The output of each stage is cached
+    under (input key, stage, parameters), where the input key chains back
+    to the source key, so changing one edit recomputes only the stages after
+    it. The same pipeline serves display proxies and full-resolution
+    exports; the source key (e.g. file identity and decoded size) tells
+    them apart.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def stage_keys(self, source_key, edits):
+        """
+        (stage, parameters, cache key) for each stage that will run.
+        """
+        stages = []
+        key = source_key
+        for name in EDIT_STAGES:
+            params = edits.get(name)
+            if params is None:
+                continue
+            key = (key, name, params)
+            stages.append((name, params, key))
+        return stages
+
+    def render(self, source_key, load_source, edits, cancelled=None, store=True):
+        """
+        Apply edits to the source, starting from the last stage already in
+        the cache. load_source() is only called if no stage is cached.
+        With store=False (full-resolution exports) cached stages are still
+        used but no new output is cached, so one export does not push the
+        display stages out of the cache.
+        Raises denoise.DenoiseCancelled if cancelled() becomes true.
+        """
+        stages = self.stage_keys(source_key, edits)
+
+        # Misses are counted once for every stage that has to be recomputed
+        pil_img = None
+        start = 0
+        for i in range(len(stages) - 1, -1, -1):
+            pil_img = self.cache.get(stages[i][2])
+            if pil_img is not None:
+                start = i + 1
+                break
+        if pil_img is None:
+            pil_img = load_source()
+
+        input_key = stages[start - 1][2] if start else source_key
+        for name, params, key in stages[start:]:
+            if cancelled is not None and cancelled():
+                raise denoise.DenoiseCancelled()
+            pil_img = STAGE_FUNCTIONS[name](pil_img, params, cancelled, input_key)
+            if store:
+                self.cache.put(key, pil_img, image_nbytes(pil_img))
+            input_key = key
+        return pil_img
@@ -0,0 +1,145 @@
+import os
+import sys
+import shutil
+
+from PIL import Image
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # not available on Windows
+
+# Linux ioctl that makes the destination share the source's data blocks (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# EXIF Orientation of an image with orientation o after k quarter turns anticlockwise
+ROTATED_ORIENTATION = {
+    1: (1, 8, 3, 6),
+    2: (2, 5, 4, 7),
+    3: (3, 6, 1, 8),
+    4: (4, 7, 2, 5),
+    5: (5, 4, 7, 2),
+    6: (6, 1, 8, 3),
+    7: (7, 2, 5, 4),
+    8: (8, 3, 6, 1),
+}
+
+
+def same_format(source, destination):
+    """
+    Whether the bytes of source can be stored under destination's name.
+    """
+    src_ext = os.path.splitext(source)[1].lower()
+    dst_ext = os.path.splitext(destination)[1].lower()
+    return src_ext == dst_ext or (src_ext in JPEG_EXTENSIONS and dst_ext in JPEG_EXTENSIONS)
+
+
+def copy_file(source, destination, hardlink=False):
+    """
+    Copy a file without decoding it: a reflink where the filesystem supports
+    it, a hard link if allowed, otherwise a plain byte copy. Returns the
+    method used: "reflink", "hardlink" or "copy".
+    """
+    if fcntl is not None and sys.platform.startswith("linux"):
+        try:
+            with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(source, destination)
+            return "reflink"
+        except OSError:
+            if os.path.exists(destination):
+                os.remove(destination)
+    if hardlink:
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError:
+            pass
+    shutil.copy2(source, destination)
+    return "copy"
+
+
+def tiff_orientation_offset(tiff):
+    """
+    Offset and byte order of the Orientation value in IFD0 of a TIFF/EXIF
+    block, or None if the tag is missing or the block is malformed.
+    """
+    if tiff[:2] == b'II':
+        byteorder = 'little'
+    elif tiff[:2] == b'MM':
+        byteorder = 'big'
+    else:
+        return None
+    ifd = int.from_bytes(tiff[4:8], byteorder)
+    if ifd + 2 > len(tiff):
+        return None
+    count = int.from_bytes(tiff[ifd:ifd + 2], byteorder)
+    for i in range(count):
+        entry = ifd + 2 + 12 * i
+        if entry + 12 > len(tiff):
+            return None
+        tag = int.from_bytes(tiff[entry:entry + 2], byteorder)
+        value_type = int.from_bytes(tiff[entry + 2:entry + 4], byteorder)
+        if tag == 0x0112:
+            # SHORT values fit in the entry itself
+            return (entry + 8, byteorder) if value_type == 3 else None
+    return None
+
+
+def jpeg_with_orientation(data, orientation):
+    """
+    JPEG bytes with the EXIF Orientation set to orientation. Only that tag
+    changes, or a minimal EXIF segment is added if the file has none; the
+    compressed image data is left as it is. Returns None if the layout is
+    not supported (e.g. EXIF without an Orientation tag).
+    """
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    insert_at = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker in (0xDA, 0xD9):
+            # Start of scan or end of image: no more metadata segments
+            break
+        length = int.from_bytes(data[pos + 2:pos + 4], 'big')
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xE1 and segment[:6] == b'Exif\x00\x00':
+            found = tiff_orientation_offset(segment[6:])
+            if found is None:
+                return None
+            offset, byteorder = found
+            at = pos + 4 + 6 + offset
+            patched = bytearray(data)
+            patched[at:at + 2] = orientation.to_bytes(2, byteorder)
+            return bytes(patched)
+        if marker == 0xE0:
+            # EXIF goes after a JFIF header
+            insert_at = pos + 2 + length
+        pos += 2 + length
+
+    if orientation == 1:
+        return data
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    payload = exif.tobytes()
+    segment = b'\xff\xe1' + (len(payload) + 2).to_bytes(2, 'big') + payload
+    return data[:insert_at] + segment + data[insert_at:]
+
+
+def write_with_orientation(source, destination, orientation):
+    """
+    Write source to destination with its EXIF Orientation changed, without
+    re-encoding. Returns False (writing nothing) if that is not possible.
+    """
+    with open(source, 'rb') as f:
+        data = f.read()
+    patched = jpeg_with_orientation(data, orientation)
+    if patched is None:
+        return False
+    with open(destination, 'wb') as f:
+        f.write(patched)
+    shutil.copystat(source, destination)
+    return True
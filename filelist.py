@@ -0,0 +1,196 @@
+import io
+import tkinter as tk
+
+import ttkbootstrap as ttkb
+from PIL import Image, ImageTk
+
+
+class VirtualImageList:
+    """
+    Scrollable list of file names with thumbnails for very large folders.
+
+    Only the rows in view, plus margin_rows above and below, exist as canvas
+    items, and only those rows hold a PhotoImage; rows that scroll away are
+    deleted together with their thumbnails. Thumbnails are handed in as
+    encoded data through show_thumbnail() and decoded only for rows that
+    exist. on_select(index) is called when a row is clicked and
+    on_view_change() when the rows in view change.
+    """
+
+    def __init__(self, parent, row_height, thumbnail_width, width, placeholder,
+                 on_select=None, on_view_change=None, margin_rows=10):
+        self.row_height = row_height
+        self.thumbnail_width = thumbnail_width
+        self.width = width
+        self.placeholder = placeholder
+        self.on_select = on_select
+        self.on_view_change = on_view_change
+        self.margin_rows = margin_rows
+        self.names = []
+        self.folder = None     # Folder the names were listed from
+        self.selected = None
+        self._index = {}       # name -> row
+        self._rows = {}        # row -> (image item, text item) for the rows that exist
+        self._photos = {}      # row -> PhotoImage shown in that row
+        self._view = (0, 0)
+
+        self.canvas = tk.Canvas(parent, width=width, highlightthickness=0, yscrollincrement=row_height)
+        self.scrollbar = ttkb.Scrollbar(parent, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel)                          # Windows / macOS
+        self.canvas.bind("<Button-4>", lambda event: self.canvas.yview_scroll(-3, "units"))  # Linux scroll up
+        self.canvas.bind("<Button-5>", lambda event: self.canvas.yview_scroll(3, "units"))   # Linux scroll down
+        self.apply_theme()
+
+    def apply_theme(self):
+        """
+        Take the colours of the current ttkbootstrap theme.
+        """
+        colors = ttkb.Style().colors
+        self.canvas.configure(bg=colors.bg)
+        self.text_color = colors.fg
+        self.select_color = colors.selectbg
+        self.select_text_color = colors.selectfg
+        # Recolour the rows in place, keeping their thumbnails
+        for row, (_, text_item) in self._rows.items():
+            self.canvas.itemconfigure(text_item, fill=self._text_fill(row))
+        self.select(self.selected)
+
+    def set_items(self, names, folder=None):
+        self._clear_rows()
+        self.names = list(names)
+        self.folder = folder
+        self._index = {name: row for row, name in enumerate(self.names)}
+        self.selected = None
+        self.canvas.delete("selection")
+        self.canvas.configure(scrollregion=(0, 0, self.width, len(self.names) * self.row_height))
+        self._view = (0, 0)
+        self.refresh()
+
+    def visible_rows(self):
+        """
+        First and one-past-last row in view.
+        """
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.row_height))
+        last = min(len(self.names), int((top + self.canvas.winfo_height()) // self.row_height) + 1)
+        return first, max(first, last)
+
+    def window_names(self):
+        """
+        Names of the rows in view from top to bottom, then of the margin
+        rows, nearest to the view first.
+        """
+        first, last = self.visible_rows()
+        names = self.names[first:last]
+        for k in range(1, self.margin_rows + 1):
+            if last - 1 + k < len(self.names):
+                names.append(self.names[last - 1 + k])
+            if first - k >= 0:
+                names.append(self.names[first - k])
+        return names
+
+    def refresh(self):
+        """
+        Create the rows that came into the window and delete the ones that left it.
+        """
+        first, last = self.visible_rows()
+        start = max(0, first - self.margin_rows)
+        end = min(len(self.names), last + self.margin_rows)
+        for row in [row for row in self._rows if row < start or row >= end]:
+            self._delete_row(row)
+        for row in range(start, end):
+            if row not in self._rows:
+                self._create_row(row)
+        if (first, last) != self._view:
+            self._view = (first, last)
+            if self.on_view_change is not None:
+                self.on_view_change()
+
+    def has_thumbnail(self, name):
+        return self._index.get(name) in self._photos
+
+    def show_thumbnail(self, name, data):
+        """
+        Show encoded thumbnail data in name's row if that row exists.
+        Returns whether it was used.
+        """
+        row = self._index.get(name)
+        if row not in self._rows:
+            return False
+        with Image.open(io.BytesIO(data)) as thumb_img:
+            photo = ImageTk.PhotoImage(thumb_img)
+        self._photos[row] = photo
+        self.canvas.itemconfigure(self._rows[row][0], image=photo)
+        return True
+
+    def select(self, row):
+        previous = self.selected
+        self.selected = row
+        self.canvas.delete("selection")
+        if row is not None and 0 <= row < len(self.names):
+            y = row * self.row_height
+            self.canvas.create_rectangle(
+                0, y, max(self.width, self.canvas.winfo_width()), y + self.row_height,
+                fill=self.select_color, outline="", tags=("selection",)
+            )
+            self.canvas.tag_lower("selection")
+        for changed in (previous, row):
+            if changed in self._rows:
+                self.canvas.itemconfigure(self._rows[changed][1], fill=self._text_fill(changed))
+
+    def see(self, row):
+        """
+        Scroll row to the middle of the view unless it is fully in view already.
+        """
+        if not self.names:
+            return
+        top = self.canvas.canvasy(0)
+        height = self.canvas.winfo_height()
+        y = row * self.row_height
+        if top <= y and y + self.row_height <= top + height:
+            return
+        total = len(self.names) * self.row_height
+        self.canvas.yview_moveto(max(0, y - (height - self.row_height) / 2) / total)
+
+    def _text_fill(self, row):
+        return self.select_text_color if row == self.selected else self.text_color
+
+    def _create_row(self, row):
+        y = row * self.row_height + self.row_height // 2
+        image_item = self.canvas.create_image(
+            4, y, image=self._photos.get(row, self.placeholder), anchor=tk.W, tags=("row",)
+        )
+        text_item = self.canvas.create_text(
+            self.thumbnail_width + 12, y, text=self.names[row], anchor=tk.W,
+            fill=self._text_fill(row), tags=("row",)
+        )
+        self._rows[row] = (image_item, text_item)
+
+    def _delete_row(self, row):
+        for item in self._rows.pop(row):
+            self.canvas.delete(item)
+        # Release the thumbnail with the row
+        self._photos.pop(row, None)
+
+    def _clear_rows(self):
+        self.canvas.delete("row")
+        self._rows.clear()
+        self._photos.clear()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def _on_click(self, event):
+        row = int(self.canvas.canvasy(event.y) // self.row_height)
+        if 0 <= row < len(self.names):
+            self.select(row)
+            if self.on_select is not None:
+                self.on_select(row)
+
+    def _on_mouse_wheel(self, event):
+        self.canvas.yview_scroll(-3 if event.delta > 0 else 3, "units")
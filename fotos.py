@@ -1,28 +1,25 @@
 import os
 import json
-import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
 import exifread
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from datetime import datetime
-from PIL import Image, ImageTk, ImageOps, ImageEnhance
-
-# Attempt NumPy import
-try:
-    import numpy as np
-except ImportError:
-    np = None  # fallback if not available
-
-# Attempt OpenCV import
-try:
-    import cv2
-except ImportError:
-    cv2 = None  # fallback if not available
+from PIL import Image, ImageTk, ImageOps
 
 import webbrowser  # for opening help link
 
 # Import denoise from external file
 import denoise  # Make sure denoise.py is in the same directory
+from scheduler import RenderScheduler
+from prefetch import ImagePrefetcher
+from pyramid import ImagePyramid
+from cache import ByteLRUCache
+from edits import EditPipeline, ORIENTATION_TRANSPOSE
+from thumbnails import THUMBNAIL_SIZE, ThumbnailLoader, thumbnail_workers
+from filelist import VirtualImageList
+from export import JPEG_EXTENSIONS, ROTATED_ORIENTATION, copy_file, same_format, write_with_orientation
 
 # ttkbootstrap imports
 import ttkbootstrap as ttkb
@@ -50,6 +47,36 @@ ASPECT_RATIO_OPTIONS = {
     "1920x1080": (1920, 1080),
 }
 
+# Denoise modes offered in the denoise window: menu label -> denoise mode
+DENOISE_MODE_OPTIONS = {
+    "Color (luminancia y croma)": "color",
+    "Solo luminancia": "luma",
+    "Luminancia + croma rápida": "luma_chroma",
+}
+
+# Algorithms for denoising without OpenCV: menu label -> denoise fallback
+FALLBACK_ALGORITHM_OPTIONS = {
+    "Ventana (exacto)": "window",
+    "Histograma (rápido con radios grandes)": "histogram",
+}
+
+# Extra area rendered around the visible canvas, as a fraction of its size, so short pans only move the image
+VIEWPORT_MARGIN = 0.5
+
+# Idle time after the last zoom or pan event before the view is redrawn in full quality
+INTERACTIVE_IDLE_MS = 150
+
+# Thumbnails reach the file lists through a queue drained in batches on the Tk thread
+THUMBNAIL_DRAIN_MS = 50
+THUMBNAIL_BATCH = 100
+
+# Width of the file lists, and rows either side of the current photo whose thumbnails are loaded ahead
+FILE_LIST_WIDTH = 240
+NEARBY_THUMBNAIL_ROWS = 20
+
+# Tolerance when comparing display scales, so float rounding does not trigger re-renders
+SCALE_EPSILON = 1e-6
+
 class EnhancedImageBrowser:
     def __init__(self, root):
         self.root = root
@@ -71,22 +98,35 @@ class EnhancedImageBrowser:
         self.image_list = []
         self.seleccion_list = []
         self.current_index = 0
-        self.original_image_pil = None         # Raw loaded image (unmodified)
+        self.original_image_pil = None         # Raw loaded image (unmodified, not even oriented)
         self.current_display_image_pil = None  # Exposure+denoise version
+        self.display_proxy_scale = 1.0         # Resolution of the above relative to the full-size image
+        self.display_denoise_params = None     # Denoise previewed on the current photo, kept when it is rendered again
+        self.full_image_size = (0, 0)          # Full-resolution size of the oriented, rotated image
+        self.image_orientation = 1             # EXIF Orientation of the current file
+        self.original_scale = 1.0              # Resolution of original_image_pil relative to full size
         self.display_image_tk = None
+        self.display_pyramid = None            # Zoom levels of the image on the canvas
+        self.rendered_view = None              # Part of the zoomed image currently on the canvas
+        self.interactive_render = False        # Fast, lower-quality resampling while zooming or panning
+        self.refine_after_id = None
         self.exposure_factor = 1.0
+        self.rotation_steps = 0                # Quarter turns applied to the original (ACW positive)
         self.selection_coords = None
         self.canvas_rect_id = None
 
-        # Store thumbnail references
-        self.thumb_images_left = {}
-        self.thumb_images_right = {}
+        # Missing thumbnails are built in parallel; Pillow releases the GIL while decoding
+        self.thumbnail_pool = ThreadPoolExecutor(max_workers=thumbnail_workers())
+        self.thumbnail_queue = queue.Queue()   # (list, folder, filename, JPEG data) from the loaders
+        self.thumbnail_loaders = {}            # list -> ThumbnailLoader of the folder it shows
 
         # Denoise parameters
         self.enable_denoise_var = tk.BooleanVar(value=False)
         self.denoise_radius_var = tk.IntVar(value=2)
         self.denoise_tol_var = tk.IntVar(value=10)
         self.denoise_mix_var = tk.DoubleVar(value=1.0)
+        self.denoise_mode_var = tk.StringVar(value="color")
+        self.denoise_fallback_var = tk.StringVar(value="window")
 
         # Zoom/pan states
         self.zoom_scale = 1.0
@@ -97,27 +137,38 @@ class EnhancedImageBrowser:
         self.dragging = False
         self.auto_fit = True  # Flag to control auto-fitting
 
-        # Caching for exposure-adjusted images
-        self.exposure_cache = {}
+        # Edits are applied by a pipeline that caches each stage, shared across photos and bounded in bytes
+        self.edit_pipeline = EditPipeline(ByteLRUCache(int(self.config["edit_cache_mb"]) * 1024 * 1024))
 
         # Store current image path
         self.current_image_path = ""
 
+        # Decoded images read ahead in the direction of navigation
+        self.nav_direction = 1
+        self.prefetcher = ImagePrefetcher(
+            self.decode_image_file,
+            max_bytes=int(self.config["prefetch_cache_mb"]) * 1024 * 1024
+        )
+
         # We will NOT keep a giant list of displayed PhotoImages.
-        # Instead, we will only keep references for thumbnails and
+        # The file lists only keep thumbnails for the rows on screen, plus
         # a single reference for the main displayed image.
 
-        # Create placeholder image for Treeview
+        # Create placeholder image for the file lists
         self.placeholder_image = self.create_placeholder_image()
 
         # ADDED/CHANGED: Selected aspect ratio mode
         # This variable will store the final size (width, height) or None for libre
         self.selected_aspect_size = None  
 
+        # Single background renderer for exposure/denoise; latest request wins
+        self.render_scheduler = RenderScheduler(self.root)
+
         # Build the UI
         self.create_widgets()
         self.setup_layout()
         self.bind_events()
+        self.root.after(THUMBNAIL_DRAIN_MS, self.drain_thumbnail_queue)
 
         # Show welcome window after widgets are created
         self.show_welcome_window()
@@ -126,7 +177,7 @@ class EnhancedImageBrowser:
     # Crear Imagen de Marcador de Posición
     # -------------------------
     def create_placeholder_image(self):
-        """Crea una imagen de marcador de posición para usar en el Treeview."""
+        """Crea una imagen de marcador de posición para usar en las listas de archivos."""
         img = Image.new('RGB', (64, 64), color='gray')
         draw = ImageOps.expand(img, border=2, fill='black')
         return ImageTk.PhotoImage(draw)
@@ -216,7 +267,12 @@ class EnhancedImageBrowser:
             "delete_photo": "q",
             "rotate_left_photo": ",",
             "rotate_right_photo": ".",
-            "theme": "darkly"
+            "theme": "darkly",
+            "prefetch_ahead": 3,
+            "prefetch_behind": 1,
+            "prefetch_cache_mb": 1024,
+            "edit_cache_mb": 512,
+            "export_hardlinks": False
         }
         if os.path.exists(CONFIG_FILENAME):
             try:
@@ -300,23 +356,22 @@ class EnhancedImageBrowser:
         self.main_frame = ttkb.Frame(self.root)
         self.main_frame.pack(fill=tk.BOTH, expand=True)
 
-        # Left column: Treeview for folder images
+        # Left column: list of folder images
         self.left_frame = ttkb.Frame(self.main_frame)
         self.left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
 
-        style = ttkb.Style()
-        # Adjust rowheight for 64px thumbnail
-        thumbnail_size = 64
+        # Row height for 64px thumbnail
+        thumbnail_size = THUMBNAIL_SIZE[1]
         padding = 8
         row_height = thumbnail_size + padding
-        style.configure("Treeview", rowheight=row_height)
 
-        self.folder_tree = ttkb.Treeview(self.left_frame, show="tree", selectmode='browse')
-        self.folder_tree.pack(side=tk.LEFT, fill=tk.Y, expand=True)
+        self.folder_tree = VirtualImageList(
+            self.left_frame, row_height, THUMBNAIL_SIZE[0], FILE_LIST_WIDTH, self.placeholder_image
+        )
+        self.folder_tree.canvas.pack(side=tk.LEFT, fill=tk.Y, expand=True)
 
-        self.folder_scroll = ttkb.Scrollbar(self.left_frame, orient="vertical", command=self.folder_tree.yview)
+        self.folder_scroll = self.folder_tree.scrollbar
         self.folder_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.folder_tree.configure(yscrollcommand=self.folder_scroll.set)
 
         # Center column: Canvas for image display
         self.center_frame = ttkb.Frame(self.main_frame)
@@ -325,16 +380,17 @@ class EnhancedImageBrowser:
         self.image_canvas = tk.Canvas(self.center_frame, bg="black", highlightthickness=0)
         self.image_canvas.pack(fill=tk.BOTH, expand=True)
 
-        # Right column: Treeview for 'seleccion'
+        # Right column: list of 'seleccion'
         self.right_frame = ttkb.Frame(self.main_frame)
         self.right_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
 
-        self.seleccion_tree = ttkb.Treeview(self.right_frame, show="tree", selectmode='browse')
-        self.seleccion_tree.pack(side=tk.LEFT, fill=tk.Y, expand=True)
+        self.seleccion_tree = VirtualImageList(
+            self.right_frame, row_height, THUMBNAIL_SIZE[0], FILE_LIST_WIDTH, self.placeholder_image
+        )
+        self.seleccion_tree.canvas.pack(side=tk.LEFT, fill=tk.Y, expand=True)
 
-        self.seleccion_scroll = ttkb.Scrollbar(self.right_frame, orient="vertical", command=self.seleccion_tree.yview)
+        self.seleccion_scroll = self.seleccion_tree.scrollbar
         self.seleccion_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        self.seleccion_tree.configure(yscrollcommand=self.seleccion_scroll.set)
 
         # Bottom status bar
         self.status_var = tk.StringVar()
@@ -413,6 +469,8 @@ class EnhancedImageBrowser:
         """Cambia el tema de la aplicación."""
         try:
             self.style.theme_use(theme_name)
+            self.folder_tree.apply_theme()
+            self.seleccion_tree.apply_theme()
             self.config["theme"] = theme_name
             self.save_config()
             self.update_status(f"Tema cambiado a '{theme_name}'.")
@@ -438,7 +496,7 @@ class EnhancedImageBrowser:
     def open_denoise_window(self):
         denoise_window = ttkb.Toplevel(self.root)
         denoise_window.title("Reducción de ruido")
-        denoise_window.geometry("400x300")
+        denoise_window.geometry("400x340")
         denoise_window.grab_set()
         denoise_window.attributes("-topmost", True)
 
@@ -468,6 +526,36 @@ class EnhancedImageBrowser:
         mix_entry = ttkb.Spinbox(mix_frame, from_=0.0, to=1.0, increment=0.1, textvariable=mix_var)
         mix_entry.pack(side=tk.LEFT, padx=5)
 
+        # Mode
+        mode_frame = ttkb.Frame(denoise_window)
+        mode_frame.pack(pady=5, padx=10, fill=tk.X)
+        ttkb.Label(mode_frame, text="Modo:").pack(side=tk.LEFT, padx=5)
+        mode_labels = {mode: label for label, mode in DENOISE_MODE_OPTIONS.items()}
+        mode_var = tk.StringVar(value=mode_labels[self.denoise_mode_var.get()])
+        mode_combo = ttkb.Combobox(
+            mode_frame,
+            textvariable=mode_var,
+            values=list(DENOISE_MODE_OPTIONS.keys()),
+            state="readonly"
+        )
+        mode_combo.pack(side=tk.LEFT, padx=5)
+
+        # Fallback algorithm, only relevant when OpenCV is not installed
+        fallback_labels = {algo: label for label, algo in FALLBACK_ALGORITHM_OPTIONS.items()}
+        fallback_var = tk.StringVar(value=fallback_labels[self.denoise_fallback_var.get()])
+        if denoise.cv2 is None:
+            denoise_window.geometry("400x380")
+            fallback_frame = ttkb.Frame(denoise_window)
+            fallback_frame.pack(pady=5, padx=10, fill=tk.X)
+            ttkb.Label(fallback_frame, text="Algoritmo:").pack(side=tk.LEFT, padx=5)
+            fallback_combo = ttkb.Combobox(
+                fallback_frame,
+                textvariable=fallback_var,
+                values=list(FALLBACK_ALGORITHM_OPTIONS.keys()),
+                state="readonly"
+            )
+            fallback_combo.pack(side=tk.LEFT, padx=5)
+
         # Buttons: Preview and Apply & Close
         button_frame = ttkb.Frame(denoise_window)
         button_frame.pack(pady=20)
@@ -475,7 +563,9 @@ class EnhancedImageBrowser:
         preview_button = ttkb.Button(button_frame, text="Previsualizar", command=lambda: self.preview_denoise(
             radius_var.get(),
             tol_var.get(),
-            mix_var.get()
+            mix_var.get(),
+            DENOISE_MODE_OPTIONS[mode_var.get()],
+            FALLBACK_ALGORITHM_OPTIONS[fallback_var.get()]
         ), bootstyle=INFO)
         preview_button.pack(side=tk.LEFT, padx=10)
 
@@ -483,71 +573,145 @@ class EnhancedImageBrowser:
             radius_var.get(),
             tol_var.get(),
             mix_var.get(),
+            DENOISE_MODE_OPTIONS[mode_var.get()],
+            FALLBACK_ALGORITHM_OPTIONS[fallback_var.get()],
             denoise_window
         ), bootstyle=SUCCESS)
         apply_button.pack(side=tk.LEFT, padx=10)
 
-    def preview_denoise(self, radius, tolerance, mix):
+    def preview_denoise(self, radius, tolerance, mix, mode="color", fallback="window"):
         if not self.original_image_pil:
             messagebox.showwarning("Advertencia", "No hay imagen cargada para previsualizar.")
             return
 
-        def denoise_thread():
-            try:
-                # Start from original_image_pil, apply exposure
-                pil_img = self.apply_exposure(self.original_image_pil, self.exposure_factor, self.current_image_path)
-                # Apply denoise
-                denoised_img = denoise.denoise_image(
-                    pil_img,
-                    radius=radius,
-                    tolerance=tolerance,
-                    mix=mix
-                )
-                # Schedule UI update in main thread
-                self.root.after(0, lambda: self.update_displayed_image(denoised_img))
-                self.update_status("Previsualización de reducción de ruido aplicada.")
-            except Exception as e:
-                self.update_status(f"Error en previsualización de denoising: {e}")
-                self.root.after(0, lambda: messagebox.showerror("Error", f"No se pudo previsualizar.\n{e}"))
+        def on_done(result):
+            self.apply_render_result(result)
+            self.display_denoise_params = (radius, tolerance, mix, mode, fallback)
+            self.update_status("Previsualización de reducción de ruido aplicada.")
 
-        threading.Thread(target=denoise_thread, daemon=True).start()
+        def on_error(e):
+            self.update_status(f"Error en previsualización de denoising: {e}")
+            messagebox.showerror("Error", f"No se pudo previsualizar.\n{e}")
 
-    def apply_denoise_and_close(self, radius, tolerance, mix, window):
+        self.render_scheduler.submit(self.make_render_job((radius, tolerance, mix, mode, fallback)), on_done, on_error)
+
+    def apply_denoise_and_close(self, radius, tolerance, mix, mode, fallback, window):
         if not self.original_image_pil:
             messagebox.showwarning("Advertencia", "No hay imagen cargada para aplicar.")
             return
 
-        def denoise_thread():
-            try:
-                # Start from original_image_pil, apply exposure
-                pil_img = self.apply_exposure(self.original_image_pil, self.exposure_factor, self.current_image_path)
-                # Apply denoise
-                denoised_img = denoise.denoise_image(
-                    pil_img,
-                    radius=radius,
-                    tolerance=tolerance,
-                    mix=mix
-                )
-                # Update stored images
-                self.original_image_pil = ImageOps.exif_transpose(self.original_image_pil)
-                self.current_display_image_pil = denoised_img
+        def on_done(result):
+            self.apply_render_result(result)
+            self.display_denoise_params = (radius, tolerance, mix, mode, fallback)
+            self.update_status("Reducción de ruido aplicada.")
 
-                self.root.after(0, lambda: self.update_image_on_canvas(denoised_img))
-                self.update_status("Reducción de ruido aplicada.")
-            except Exception as e:
-                self.update_status(f"Error al aplicar denoising: {e}")
-                self.root.after(0, lambda: messagebox.showerror("Error", f"No se pudo aplicar.\n{e}"))
+        def on_error(e):
+            self.update_status(f"Error al aplicar denoising: {e}")
+            messagebox.showerror("Error", f"No se pudo aplicar.\n{e}")
 
-        threading.Thread(target=denoise_thread, daemon=True).start()
+        self.render_scheduler.submit(self.make_render_job((radius, tolerance, mix, mode, fallback)), on_done, on_error)
         window.destroy()
 
+    def make_render_job(self, denoise_params=None):
+        """
+        Capture the current image and edit state on the Tk thread and return a
+        job for the render scheduler. The job runs the display edits through
+        the edit pipeline and, when denoise_params (radius, tolerance, mix,
+        mode, fallback) is given, denoises at the preview scale. If the zoom
+        needs more detail than the decoded source has, the job first decodes
+        the file again at a finer DCT scale.
+        It returns (image, proxy_scale, source, source_scale); scales are
+        relative to the full-resolution image.
+        """
+        original = self.original_image_pil
+        original_scale = self.original_scale
+        image_path = self.current_image_path
+        full_size = max(self.full_image_size)
+        edits = self.get_edits()
+        preview_scale = self.get_preview_scale()
+        needs_source = original_scale < preview_scale - SCALE_EPSILON
+        reduction = self.get_decode_reduction(preview_scale)
+
+        def job(cancelled):
+            source, source_scale = original, original_scale
+            if needs_source:
+                source = self.prefetcher.load(image_path, reduction)
+                source_scale = max(source.size) / full_size
+
+            job_edits = dict(edits)
+            scale = source_scale
+            if denoise_params:
+                # The proxy is sized against the decoded source, the filter against the full-size image
+                relative_scale = min(1.0, preview_scale / source_scale)
+                filter_scale = min(1.0, preview_scale)
+                job_edits["denoise"] = tuple(denoise_params) + (relative_scale, filter_scale)
+                if relative_scale < 1.0:
+                    scale = preview_scale
+
+            # File identity and decoded size identify the source of the edit graph
+            source_key = (self.prefetcher.cache_key(image_path), source.size)
+            pil_img = self.edit_pipeline.render(source_key, lambda: source, job_edits, cancelled)
+            return pil_img, scale, source, source_scale
+
+        return job
+
+    def get_edits(self, export=False):
+        """
+        Current edits as parameters for the edit pipeline. The crop, the
+        aspect-ratio resize and full-resolution denoise only apply to exports;
+        on screen the selection is drawn as a rectangle and denoise runs on
+        the preview.
+        """
+        factor = round(self.exposure_factor, 2)
+        edits = {
+            "orientation": self.image_orientation if self.image_orientation in ORIENTATION_TRANSPOSE else None,
+            "rotation": self.rotation_steps or None,
+            "exposure": factor if factor != 1.0 else None,
+        }
+        if export:
+            edits["crop"] = self.get_crop_box()
+            edits["resize"] = self.selected_aspect_size
+            if self.enable_denoise_var.get():
+                edits["denoise"] = (
+                    self.denoise_radius_var.get(),
+                    self.denoise_tol_var.get(),
+                    self.denoise_mix_var.get(),
+                    self.denoise_mode_var.get(),
+                    self.denoise_fallback_var.get(),
+                    None,
+                    None
+                )
+        return edits
+
+    def apply_render_result(self, result):
+        """
+        Show a render produced by a make_render_job job (Tk thread only).
+        """
+        pil_img, scale, source, source_scale = result
+        if source is not self.original_image_pil:
+            self.original_image_pil = source
+            self.original_scale = source_scale
+        self.update_displayed_image(pil_img, scale)
+
     # -------------------------
     # Info Window
     # -------------------------
     def show_info(self):
         info = "Enhanced Image Browser\nVersión 1.0\nDesarrollado por Jocarsa."
+        info += "\n\nCachés:"
+        info += self.format_cache_stats("Edición", self.edit_pipeline.cache.stats())
+        info += self.format_cache_stats("Imágenes decodificadas", self.prefetcher.cache.stats())
+        info += self.format_cache_stats("Vista previa de ruido", denoise.preview_cache.stats())
         messagebox.showinfo("Información", info)
 
+    def format_cache_stats(self, name, stats):
+        mb = 1024 * 1024
+        return (
+            f"\n{name}: {stats['entries']} entradas, "
+            f"{stats['bytes'] / mb:.0f}/{stats['max_bytes'] / mb:.0f} MB, "
+            f"{stats['hits']} aciertos, {stats['misses']} fallos"
+        )
+
     # -------------------------
     # Setup Layout
     # -------------------------
@@ -577,9 +741,11 @@ class EnhancedImageBrowser:
         self.image_canvas.bind("<Button-4>", self.on_mouse_wheel_linux)  # Linux scroll up
         self.image_canvas.bind("<Button-5>", self.on_mouse_wheel_linux)  # Linux scroll down
 
-        # Treeview selection
-        self.folder_tree.bind("<<TreeviewSelect>>", self.on_tree_select)
-        self.seleccion_tree.bind("<<TreeviewSelect>>", self.on_tree_select_seleccion)
+        # File list selection and scrolling
+        self.folder_tree.on_select = self.on_tree_select
+        self.seleccion_tree.on_select = self.on_tree_select_seleccion
+        self.folder_tree.on_view_change = lambda: self.request_thumbnails(self.folder_tree)
+        self.seleccion_tree.on_view_change = lambda: self.request_thumbnails(self.seleccion_tree)
 
         # Handle window resize
         self.center_frame.bind("<Configure>", self.on_center_frame_resize)
@@ -740,20 +906,6 @@ class EnhancedImageBrowser:
             self.settings["last_folder"] = self.folder_path
             self.save_settings()
 
-            # Generate thumbnails in background
-            self.start_thumbnail_generation(
-                folder_path=self.folder_path,
-                image_list=self.image_list,
-                thumb_dict=self.thumb_images_left,
-                tree=self.folder_tree
-            )
-            self.start_thumbnail_generation(
-                folder_path=self.seleccion_folder,
-                image_list=self.seleccion_list,
-                thumb_dict=self.thumb_images_right,
-                tree=self.seleccion_tree
-            )
-
             if self.image_list:
                 self.current_index = 0
                 self.display_image(self.current_index, fit=False)
@@ -766,15 +918,14 @@ class EnhancedImageBrowser:
         supported_extensions = ('.jpg', '.jpeg', '.JPG', '.JPEG')
         self.image_list = [f for f in os.listdir(self.folder_path) if f.lower().endswith(supported_extensions)]
         self.image_list.sort()
+        # Files may have been renamed or replaced; start the read-ahead afresh
+        self.prefetcher.clear()
 
     def populate_folder_tree(self):
-        self.folder_tree.delete(*self.folder_tree.get_children())
-        for idx, fname in enumerate(self.image_list):
-            thumbnail = self.thumb_images_left.get(fname, self.placeholder_image)
-            self.folder_tree.insert("", "end", iid=str(idx), text=fname, image=thumbnail)
+        self.folder_tree.set_items(self.image_list, self.folder_path)
+        self.start_thumbnail_loading(self.folder_tree)
 
     def populate_seleccion_tree(self):
-        self.seleccion_tree.delete(*self.seleccion_tree.get_children())
         supported_extensions = ('.jpg', '.jpeg', '.JPG', '.JPEG')
         if os.path.exists(self.seleccion_folder):
             self.seleccion_list = sorted(
@@ -782,77 +933,82 @@ class EnhancedImageBrowser:
             )
         else:
             self.seleccion_list = []
-        for idx, fname in enumerate(self.seleccion_list):
-            thumbnail = self.thumb_images_right.get(fname, self.placeholder_image)
-            self.seleccion_tree.insert("", "end", iid=str(idx), text=fname, image=thumbnail)
-
-    def on_tree_select(self, event):
-        item_id = self.folder_tree.focus()
-        if item_id.isdigit():
-            selected_index = int(item_id)
-            if selected_index != self.current_index:
-                self.current_index = selected_index
-                self.display_image(self.current_index, fit=False)
+        self.seleccion_tree.set_items(self.seleccion_list, self.seleccion_folder)
+        self.start_thumbnail_loading(self.seleccion_tree)
+
+    def on_tree_select(self, selected_index):
+        if selected_index != self.current_index:
+            self.nav_direction = 1 if selected_index > self.current_index else -1
+            self.current_index = selected_index
+            self.display_image(self.current_index, fit=False)
 
-    def on_tree_select_seleccion(self, event):
-        item_id = self.seleccion_tree.focus()
-        if item_id.isdigit():
-            selected_index = int(item_id)
-            if selected_index < len(self.seleccion_list):
-                fname = self.seleccion_list[selected_index]
-                self.update_status(f"'seleccion' folder item selected: {fname}")
+    def on_tree_select_seleccion(self, selected_index):
+        if selected_index < len(self.seleccion_list):
+            fname = self.seleccion_list[selected_index]
+            self.update_status(f"'seleccion' folder item selected: {fname}")
 
     # -------------------------
-    # Thumbnails Generation
+    # Thumbnails Loading
     # -------------------------
-    def start_thumbnail_generation(self, folder_path, image_list, thumb_dict, tree, subfolder_name="miniaturas"):
-        thread = threading.Thread(
-            target=self.generate_thumbnails_in_background,
-            args=(folder_path, image_list, thumb_dict, tree, subfolder_name),
-            daemon=True
-        )
-        thread.start()
-
-    def generate_thumbnails_in_background(self, folder_path, image_list, thumb_dict, tree, subfolder_name):
-        if not folder_path:
+    def start_thumbnail_loading(self, file_list):
+        """
+        Replace the thumbnail loader of file_list with one for the folder it
+        now shows, and ask it for the rows on screen.
+        """
+        loader = self.thumbnail_loaders.pop(file_list, None)
+        if loader is not None:
+            loader.stop()
+        if not file_list.folder:
             return
-        thumbs_folder = os.path.join(folder_path, subfolder_name)
-        os.makedirs(thumbs_folder, exist_ok=True)
-
-        result_list = []
-        for filename in image_list:
-            source_path = os.path.join(folder_path, filename)
-            base, ext = os.path.splitext(filename)
-            thumb_filename = base + "_thumb.jpg"
-            thumb_path = os.path.join(thumbs_folder, thumb_filename)
-
-            if not os.path.exists(thumb_path):
-                try:
-                    with Image.open(source_path) as img:
-                        img = ImageOps.exif_transpose(img)
-                        img.thumbnail((64, 64))
-                        img.save(thumb_path, format="JPEG", quality=70)
-                except Exception as e:
-                    print(f"Could not generate thumbnail for {source_path}: {e}")
-                    continue
 
-            result_list.append((filename, thumb_path))
+        def deliver(filename, data, file_list=file_list, folder_path=file_list.folder):
+            self.thumbnail_queue.put((file_list, folder_path, filename, data))
 
-        def update_thumbs():
-            for filename, thumb_path in result_list:
-                try:
-                    with Image.open(thumb_path) as thumb_img:
-                        tk_thumb = ImageTk.PhotoImage(thumb_img)
-                        thumb_dict[filename] = tk_thumb
-                    # Update the Treeview item with the new thumbnail
-                    for item_id in tree.get_children():
-                        if tree.item(item_id, "text") == filename:
-                            tree.item(item_id, image=tk_thumb)
-                            break
-                except Exception as e:
-                    print(f"Could not load thumbnail image: {thumb_path} => {e}")
+        self.thumbnail_loaders[file_list] = ThumbnailLoader(
+            file_list.folder, file_list.names, self.thumbnail_pool, deliver, thumbnail_workers()
+        )
+        self.request_thumbnails(file_list)
 
-        self.root.after(50, update_thumbs)
+    def request_thumbnails(self, file_list):
+        """
+        Ask for the thumbnails the list is missing: the rows on screen first,
+        then the rows just off screen and, for the folder list, the rows
+        around the current photo.
+        """
+        loader = self.thumbnail_loaders.get(file_list)
+        if loader is None:
+            return
+        names = file_list.window_names()
+        if file_list is self.folder_tree and self.image_list:
+            first = max(0, self.current_index - NEARBY_THUMBNAIL_ROWS)
+            last = min(len(self.image_list), self.current_index + NEARBY_THUMBNAIL_ROWS + 1)
+            names += self.image_list[first:last]
+        seen = set()
+        wanted = []
+        for name in names:
+            if name not in seen and not file_list.has_thumbnail(name):
+                seen.add(name)
+                wanted.append(name)
+        loader.request(wanted)
+
+    def drain_thumbnail_queue(self):
+        """
+        Show up to THUMBNAIL_BATCH queued thumbnails, then run again, so
+        thumbnails appear while the rest are still being loaded.
+        """
+        for _ in range(THUMBNAIL_BATCH):
+            try:
+                file_list, folder_path, filename, data = self.thumbnail_queue.get_nowait()
+            except queue.Empty:
+                break
+            # The list may have been refilled from another folder in the meantime
+            if file_list.folder != folder_path:
+                continue
+            try:
+                file_list.show_thumbnail(filename, data)
+            except Exception as e:
+                print(f"Could not load thumbnail image for {filename} => {e}")
+        self.root.after(THUMBNAIL_DRAIN_MS, self.drain_thumbnail_queue)
 
     # -------------------------
     # Image Display
@@ -864,22 +1020,33 @@ class EnhancedImageBrowser:
         image_path = os.path.join(self.folder_path, self.image_list[index])
         self.current_image_path = image_path
 
-        # Clear references to old image from the exposure cache
-        self.exposure_cache.clear()
         self.current_display_image_pil = None
+        self.display_proxy_scale = 1.0
+        self.display_denoise_params = None
         self.display_image_tk = None
+        self.display_pyramid = None
 
         try:
-            pil_img = Image.open(image_path)
-            pil_img = self.apply_exif_orientation(pil_img)
-            self.original_image_pil = pil_img
-            self.exposure_factor = 1.0
+            size, self.image_orientation = self.read_image_header(image_path)
+            self.full_image_size = size[::-1] if self.image_orientation in (5, 6, 7, 8) else size
 
             if fit:
                 self.auto_fit = True
                 self.zoom_scale = 1.0
                 self.pan_offset_x = 0
                 self.pan_offset_y = 0
+            if self.auto_fit:
+                self.zoom_scale = self.compute_fit_scale(self.full_image_size) or self.zoom_scale
+
+            # Decode only as much resolution as the canvas shows
+            reduction = self.get_decode_reduction(self.get_preview_scale())
+            pil_img = self.prefetcher.load(image_path, reduction)
+            self.schedule_prefetch(reduction)
+            self.original_image_pil = pil_img
+            self.original_scale = max(pil_img.size) / max(self.full_image_size)
+            self.display_proxy_scale = self.original_scale
+            self.exposure_factor = 1.0
+            self.rotation_steps = 0
 
             self.redisplay_with_exposure()
 
@@ -891,12 +1058,59 @@ class EnhancedImageBrowser:
             self.update_status(f"Failed to load image: {self.image_list[self.current_index]}")
             messagebox.showerror("Error", f"Failed to load image.\n{e}")
 
-    def apply_exif_orientation(self, image):
-        try:
-            image = ImageOps.exif_transpose(image)
-        except Exception as e:
-            self.update_status(f"Could not apply EXIF orientation: {e}")
-        return image
+    def decode_image_file(self, image_path, reduction=1):
+        """
+        Open and decode an image file as stored; EXIF orientation is applied
+        later by the edit pipeline. For JPEG files, reduction 2, 4 or 8 lets
+        libjpeg decode directly at that fraction of the size.
+        Runs on the prefetch threads, so it must not touch Tk.
+        """
+        img = Image.open(image_path)
+        if reduction and reduction > 1:
+            w, h = img.size
+            img.draft(img.mode, (-(-w // reduction), -(-h // reduction)))
+        img.load()
+        return img
+
+    def read_image_header(self, image_path):
+        """
+        Stored size and EXIF Orientation of an image, read from the file
+        header without decoding the pixels.
+        """
+        with Image.open(image_path) as img:
+            try:
+                orientation = img.getexif().get(0x0112, 1)
+            except Exception:
+                orientation = 1
+            return img.size, orientation
+
+    def get_decode_reduction(self, scale):
+        """
+        Largest JPEG DCT reduction (1, 2, 4 or 8) that still decodes at
+        least scale of the full resolution.
+        """
+        for reduction in (8, 4, 2):
+            if 1.0 / reduction >= scale:
+                return reduction
+        return 1
+
+    def schedule_prefetch(self, reduction=1):
+        """
+        Ask the prefetcher for the images around the current one, those in
+        the direction of navigation first.
+        """
+        n = len(self.image_list)
+        ahead = int(self.config.get("prefetch_ahead", 3))
+        behind = int(self.config.get("prefetch_behind", 1))
+        offsets = [self.nav_direction * k for k in range(1, ahead + 1)]
+        offsets += [-self.nav_direction * k for k in range(1, behind + 1)]
+        paths = []
+        for offset in offsets:
+            idx = (self.current_index + offset) % n
+            path = os.path.join(self.folder_path, self.image_list[idx])
+            if idx != self.current_index and path not in paths:
+                paths.append(path)
+        self.prefetcher.request(paths, reduction)
 
     def update_image_on_canvas(self, pil_img):
         if not pil_img:
@@ -906,35 +1120,132 @@ class EnhancedImageBrowser:
         if cw < 2 or ch < 2:
             return
 
+        # Proxies are smaller than the original, so scale relative to their resolution
         w, h = pil_img.size
-        scaled_w = int(w * self.zoom_scale)
-        scaled_h = int(h * self.zoom_scale)
-        display_img = pil_img.resize((scaled_w, scaled_h), self.get_resample_filter())
-
-        # Create a single PhotoImage reference for the current image
-        self.display_image_tk = ImageTk.PhotoImage(display_img)
+        proxy_scale = self.display_proxy_scale if pil_img is self.current_display_image_pil else 1.0
+        scaled_w = max(1, int(w * self.zoom_scale / proxy_scale))
+        scaled_h = max(1, int(h * self.zoom_scale / proxy_scale))
+        left, top = self.get_image_origin(scaled_w, scaled_h)
+
+        # Only the visible part of the zoomed image, plus a margin for panning, is rendered
+        margin_x = int(cw * VIEWPORT_MARGIN)
+        margin_y = int(ch * VIEWPORT_MARGIN)
+        x0 = max(0, -left - margin_x)
+        y0 = max(0, -top - margin_y)
+        x1 = min(scaled_w, cw - left + margin_x)
+        y1 = min(scaled_h, ch - top + margin_y)
 
-        # Clear the canvas and draw the new image
         self.image_canvas.delete("all")
-        center_x = cw / 2 + self.pan_offset_x
-        center_y = ch / 2 + self.pan_offset_y
-        self.image_canvas.create_image(
-            center_x,
-            center_y,
-            image=self.display_image_tk,
-            anchor=tk.CENTER
-        )
+        self.display_image_tk = None
+        self.rendered_view = None
+        if x1 > x0 and y1 > y0:
+            # Resample from the nearest pyramid level instead of the full image
+            if self.display_pyramid is None or self.display_pyramid.image is not pil_img:
+                self.display_pyramid = ImagePyramid(pil_img)
+            sx = w / scaled_w
+            sy = h / scaled_h
+            display_img = self.display_pyramid.resize(
+                (x1 - x0, y1 - y0),
+                self.get_resample_filter(self.interactive_render),
+                box=(x0 * sx, y0 * sy, x1 * sx, y1 * sy)
+            )
+
+            # Create a single PhotoImage reference for the current image
+            self.display_image_tk = ImageTk.PhotoImage(display_img)
+            item = self.image_canvas.create_image(
+                left + x0,
+                top + y0,
+                image=self.display_image_tk,
+                anchor=tk.NW
+            )
+            self.rendered_view = {
+                "image": pil_img,
+                "size": (scaled_w, scaled_h),
+                "canvas": (cw, ch),
+                "rect": (x0, y0, x1, y1),
+                "item": item,
+                "interactive": self.interactive_render,
+            }
 
         # Redraw selection rectangle
         self.redraw_selection()
         self.image_canvas.update_idletasks()
 
-    def get_resample_filter(self):
+        # Zoomed in beyond the decoded or denoised proxy: render it again at the new resolution
+        if pil_img is self.current_display_image_pil and \
+                self.display_proxy_scale < self.get_preview_scale() - SCALE_EPSILON:
+            self.redisplay_with_exposure()
+
+    def get_image_origin(self, scaled_w, scaled_h):
+        """
+        Canvas position of the top-left corner of the zoomed image.
+        """
+        cw = self.image_canvas.winfo_width()
+        ch = self.image_canvas.winfo_height()
+        left = int(round(cw / 2 + self.pan_offset_x - scaled_w / 2))
+        top = int(round(ch / 2 + self.pan_offset_y - scaled_h / 2))
+        return left, top
+
+    def pan_image_on_canvas(self, dx, dy):
+        """
+        Move the rendered image by (dx, dy). While the view stays inside the
+        margin rendered around it, the canvas item is just moved; otherwise
+        the visible part is rendered again.
+        """
+        view = self.rendered_view
+        cw = self.image_canvas.winfo_width()
+        ch = self.image_canvas.winfo_height()
+        if view is None or view["image"] is not self.current_display_image_pil or view["canvas"] != (cw, ch):
+            self.update_image_on_canvas(self.current_display_image_pil)
+            return
+
+        scaled_w, scaled_h = view["size"]
+        left, top = self.get_image_origin(scaled_w, scaled_h)
+        x0, y0, x1, y1 = view["rect"]
+        visible = (
+            max(0, -left), max(0, -top),
+            min(scaled_w, cw - left), min(scaled_h, ch - top)
+        )
+        if visible[0] >= x0 and visible[1] >= y0 and visible[2] <= x1 and visible[3] <= y1:
+            self.image_canvas.move(view["item"], dx, dy)
+        else:
+            self.update_image_on_canvas(self.current_display_image_pil)
+
+    def get_preview_scale(self):
+        """
+        Resolution, relative to the original image, that the canvas shows at
+        the current zoom. Previews are rendered at this size; full resolution
+        is only needed past 100% zoom or when exporting.
+        """
+        return min(1.0, self.zoom_scale)
+
+    def get_resample_filter(self, interactive=False):
+        if interactive:
+            try:
+                return Image.Resampling.NEAREST
+            except AttributeError:
+                return Image.NEAREST
         try:
             return Image.Resampling.LANCZOS
         except AttributeError:
             return Image.ANTIALIAS
 
+    def begin_interactive_render(self):
+        """
+        Switch to fast resampling for the zoom or pan gesture in progress and
+        (re)start the idle timer that redraws the view in full quality.
+        """
+        self.interactive_render = True
+        if self.refine_after_id is not None:
+            self.root.after_cancel(self.refine_after_id)
+        self.refine_after_id = self.root.after(INTERACTIVE_IDLE_MS, self.refine_display)
+
+    def refine_display(self):
+        self.refine_after_id = None
+        self.interactive_render = False
+        if self.rendered_view is not None and self.rendered_view["interactive"]:
+            self.update_image_on_canvas(self.current_display_image_pil)
+
     def on_center_frame_resize(self, event):
         if self.auto_fit:
             self.fit_image_to_canvas()
@@ -942,6 +1253,17 @@ class EnhancedImageBrowser:
             # Re-display current displayed image
             self.update_image_on_canvas(self.current_display_image_pil)
 
+    def compute_fit_scale(self, size):
+        """
+        Zoom that fits an image of the given full-resolution size in the
+        canvas (never above 100%), or None if the canvas is not laid out yet.
+        """
+        cw = self.image_canvas.winfo_width()
+        ch = self.image_canvas.winfo_height()
+        if cw < 2 or ch < 2 or not size[0] or not size[1]:
+            return None
+        return min(cw / size[0], ch / size[1], 1.0)
+
     def fit_image_to_canvas(self):
         if not self.current_display_image_pil:
             return
@@ -950,10 +1272,7 @@ class EnhancedImageBrowser:
         if cw < 2 or ch < 2:
             return
 
-        img_w, img_h = self.current_display_image_pil.size
-        scale_w = cw / img_w
-        scale_h = ch / img_h
-        self.zoom_scale = min(scale_w, scale_h, 1.0)
+        self.zoom_scale = self.compute_fit_scale(self.full_image_size) or self.zoom_scale
         self.pan_offset_x = 0
         self.pan_offset_y = 0
         self.update_image_on_canvas(self.current_display_image_pil)
@@ -963,20 +1282,21 @@ class EnhancedImageBrowser:
     # -------------------------
     def show_previous_image(self, event=None):
         if self.image_list:
+            self.nav_direction = -1
             self.current_index = (self.current_index - 1) % len(self.image_list)
             self.display_image(self.current_index, fit=False)
 
     def show_next_image(self, event=None):
         if self.image_list:
+            self.nav_direction = 1
             self.current_index = (self.current_index + 1) % len(self.image_list)
             self.display_image(self.current_index, fit=False)
 
     def highlight_current_tree_item(self):
-        for item_id in self.folder_tree.get_children():
-            self.folder_tree.selection_remove(item_id)
-        if str(self.current_index) not in self.folder_tree.selection():
-            self.folder_tree.selection_set(str(self.current_index))
-        self.folder_tree.see(str(self.current_index))
+        self.folder_tree.select(self.current_index)
+        self.folder_tree.see(self.current_index)
+        # The rows around the new photo change even when the list does not scroll
+        self.request_thumbnails(self.folder_tree)
 
     # -------------------------
     # Exposure Adjustments
@@ -1001,56 +1321,25 @@ class EnhancedImageBrowser:
         if not self.original_image_pil:
             return
 
-        def process_image():
-            try:
-                pil_adjusted = self.apply_exposure(self.original_image_pil, self.exposure_factor, self.current_image_path)
-
-                if self.enable_denoise_var.get():
-                    pil_adjusted = denoise.denoise_image(
-                        pil_adjusted,
-                        radius=self.denoise_radius_var.get(),
-                        tolerance=self.denoise_tol_var.get(),
-                        mix=self.denoise_mix_var.get()
-                    )
-
-                self.current_display_image_pil = pil_adjusted
-                self.root.after(0, lambda: self.update_image_on_canvas(self.current_display_image_pil))
-            except Exception as e:
-                self.update_status(f"Exposure Processing Error: {e}")
-                self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to apply exposure.\n{e}"))
+        # Without the denoise option, keep any denoise previewed from the denoise window
+        denoise_params = self.display_denoise_params
+        if self.enable_denoise_var.get():
+            denoise_params = (
+                self.denoise_radius_var.get(),
+                self.denoise_tol_var.get(),
+                self.denoise_mix_var.get(),
+                self.denoise_mode_var.get(),
+                self.denoise_fallback_var.get()
+            )
 
-        threading.Thread(target=process_image, daemon=True).start()
+        def on_done(result):
+            self.apply_render_result(result)
 
-    def apply_exposure(self, pil_img, factor, image_path):
-        try:
-            factor_key = round(factor, 2)
-            cache_key = (image_path, factor_key)
-
-            # If it's in the cache, return it
-            if cache_key in self.exposure_cache:
-                return self.exposure_cache[cache_key]
-
-            if cv2:
-                open_cv_image = np.array(pil_img)
-                open_cv_image = cv2.cvtColor(open_cv_image, cv2.COLOR_RGB2BGR)
-                adjusted = cv2.convertScaleAbs(open_cv_image, alpha=factor_key, beta=0)
-                adjusted = cv2.cvtColor(adjusted, cv2.COLOR_BGR2RGB)
-                pil_adjusted = Image.fromarray(adjusted)
-            elif np:
-                arr = np.asarray(pil_img).astype(np.float32)
-                arr *= factor_key
-                np.clip(arr, 0, 255, out=arr)
-                arr = arr.astype(np.uint8)
-                pil_adjusted = Image.fromarray(arr)
-            else:
-                enhancer = ImageEnhance.Brightness(pil_img)
-                pil_adjusted = enhancer.enhance(factor_key)
+        def on_error(e):
+            self.update_status(f"Exposure Processing Error: {e}")
+            messagebox.showerror("Error", f"Failed to apply exposure.\n{e}")
 
-            self.exposure_cache[cache_key] = pil_adjusted
-            return pil_adjusted
-        except Exception as e:
-            self.update_status(f"Exposure Adjustment Error: {e}")
-            return pil_img
+        self.render_scheduler.submit(self.make_render_job(denoise_params), on_done, on_error)
 
     # -------------------------
     # Rotation
@@ -1058,8 +1347,8 @@ class EnhancedImageBrowser:
     def rotate_left_90(self):
         if not self.original_image_pil:
             return
-        self.original_image_pil = self.original_image_pil.rotate(90, expand=True)
-        self.exposure_cache.clear()
+        self.rotation_steps = (self.rotation_steps + 1) % 4
+        self.full_image_size = self.full_image_size[::-1]
         self.redisplay_with_exposure()
 
     def handle_rotate_left_90(self, event=None):
@@ -1068,8 +1357,8 @@ class EnhancedImageBrowser:
     def rotate_right_90(self):
         if not self.original_image_pil:
             return
-        self.original_image_pil = self.original_image_pil.rotate(-90, expand=True)
-        self.exposure_cache.clear()
+        self.rotation_steps = (self.rotation_steps - 1) % 4
+        self.full_image_size = self.full_image_size[::-1]
         self.redisplay_with_exposure()
 
     def handle_rotate_right_90(self, event=None):
@@ -1173,7 +1462,8 @@ class EnhancedImageBrowser:
             self.last_mouse_y = event.y
             self.pan_offset_x += dx
             self.pan_offset_y += dy
-            self.update_image_on_canvas(self.current_display_image_pil)
+            self.begin_interactive_render()
+            self.pan_image_on_canvas(dx, dy)
 
     def on_pan_end(self, event):
         self.dragging = False
@@ -1186,6 +1476,7 @@ class EnhancedImageBrowser:
         if self.zoom_scale < 0.1:
             self.zoom_scale = 0.1
         self.auto_fit = False
+        self.begin_interactive_render()
         self.update_image_on_canvas(self.current_display_image_pil)
 
     def on_mouse_wheel_linux(self, event):
@@ -1196,6 +1487,7 @@ class EnhancedImageBrowser:
         if self.zoom_scale < 0.1:
             self.zoom_scale = 0.1
         self.auto_fit = False
+        self.begin_interactive_render()
         self.update_image_on_canvas(self.current_display_image_pil)
 
     # -------------------------
@@ -1218,42 +1510,48 @@ class EnhancedImageBrowser:
             counter += 1
 
         try:
-            full_img = Image.open(source_image)
-            full_img = self.apply_exif_orientation(full_img)
-            full_img = self.apply_exposure(full_img, self.exposure_factor, source_image)
-
-            if self.enable_denoise_var.get():
-                full_img = denoise.denoise_image(
-                    full_img,
-                    radius=self.denoise_radius_var.get(),
-                    tolerance=self.denoise_tol_var.get(),
-                    mix=self.denoise_mix_var.get()
+            edits = self.get_edits(export=True)
+            if self.export_without_reencoding(source_image, destination_image, edits) is None:
+                # Same edit graph as the display, on the full-resolution decode:
+                # crop to the selection and, with a fixed aspect ratio, resize to it.
+                # Full-resolution stages are not cached, to leave room for the display ones
+                size, _ = self.read_image_header(source_image)
+                source_key = (self.prefetcher.cache_key(source_image), size)
+                final_img = self.edit_pipeline.render(
+                    source_key,
+                    lambda: self.decode_image_file(source_image),
+                    edits,
+                    store=False
                 )
-
-            # ADDED/CHANGED: Crop normally, but if a ratio is selected, also re-scale.
-            final_img = self.maybe_crop(full_img)
-
-            # If we have a fixed aspect ratio (not "libre"), then also resize to that ratio.
-            if self.selected_aspect_size is not None:
-                w, h = self.selected_aspect_size
-                # Resample with a good filter
-                final_img = final_img.resize((w, h), self.get_resample_filter())
-
-            final_img.save(destination_image, quality=95)
+                final_img.save(destination_image, quality=95)
 
             self.update_status(f"Image copied to '{destination_image}'.")
             self.populate_seleccion_tree()
-
-            self.start_thumbnail_generation(
-                folder_path=self.seleccion_folder,
-                image_list=[os.path.basename(destination_image)],
-                thumb_dict=self.thumb_images_right,
-                tree=self.seleccion_tree
-            )
         except Exception as e:
             self.update_status(f"Copy Error: {e}")
             messagebox.showerror("Copy Error", f"Failed to copy image.\n{e}")
 
+    def export_without_reencoding(self, source_image, destination_image, edits):
+        """
+        Fast paths for exports whose pixels do not change: an unedited image
+        is copied as it is (reflink, optional hard link or byte copy) and a
+        rotation-only edit just rewrites the EXIF Orientation of a JPEG.
+        Returns the method used, or None if the image has to be decoded and
+        encoded again.
+        """
+        if any(edits.get(stage) is not None for stage in ("crop", "exposure", "denoise", "resize")):
+            return None
+        if not same_format(source_image, destination_image):
+            return None
+        if not self.rotation_steps:
+            return copy_file(source_image, destination_image, hardlink=bool(self.config.get("export_hardlinks", False)))
+        if os.path.splitext(source_image)[1].lower() not in JPEG_EXTENSIONS:
+            return None
+        orientation = ROTATED_ORIENTATION.get(self.image_orientation, ROTATED_ORIENTATION[1])[self.rotation_steps]
+        if write_with_orientation(source_image, destination_image, orientation):
+            return "exif"
+        return None
+
     def build_destination_filename(self, source_image):
         try:
             with open(source_image, 'rb') as img_file:
@@ -1267,12 +1565,16 @@ class EnhancedImageBrowser:
             self.update_status(f"EXIF Error: {e}. Using original filename.")
         return self.image_list[self.current_index]
 
-    def maybe_crop(self, full_img):
+    def get_crop_box(self):
+        """
+        Selection as (left, top, right, bottom) fractions of the image, or
+        None when there is no usable selection.
+        """
         if not self.selection_coords:
-            return full_img
+            return None
 
         x1, y1, x2, y2 = self.selection_coords
-        orig_w, orig_h = self.original_image_pil.size
+        orig_w, orig_h = self.full_image_size
 
         cw = self.image_canvas.winfo_width()
         ch = self.image_canvas.winfo_height()
@@ -1295,9 +1597,14 @@ class EnhancedImageBrowser:
         sel_bottom = max(0, min(sel_bottom, orig_h))
 
         if (sel_right - sel_left) < 2 or (sel_bottom - sel_top) < 2:
-            return full_img
+            return None
 
-        return full_img.crop((sel_left, sel_top, sel_right, sel_bottom))
+        return (
+            round(sel_left / orig_w, 6),
+            round(sel_top / orig_h, 6),
+            round(sel_right / orig_w, 6),
+            round(sel_bottom / orig_h, 6)
+        )
 
     # -------------------------
     # Denoising
@@ -1351,15 +1658,6 @@ class EnhancedImageBrowser:
         self.populate_folder_tree()
         self.update_status(f"Renamed {renamed_count} file(s) based on EXIF in '{self.folder_path}'.")
 
-        self.thumb_images_left.clear()
-        self.populate_folder_tree()
-        self.start_thumbnail_generation(
-            folder_path=self.folder_path,
-            image_list=self.image_list,
-            thumb_dict=self.thumb_images_left,
-            tree=self.folder_tree
-        )
-
     def build_destination_filename_rename(self, source_path, original_name):
         try:
             with open(source_path, 'rb') as img_file:
@@ -1413,14 +1711,6 @@ class EnhancedImageBrowser:
         self.load_images()
         self.populate_folder_tree()
 
-        self.thumb_images_left.clear()
-        self.start_thumbnail_generation(
-            folder_path=self.folder_path,
-            image_list=self.image_list,
-            thumb_dict=self.thumb_images_left,
-            tree=self.folder_tree
-        )
-
         if renamed_count > 0 and not errors:
             self.update_status(f"Renombradas {renamed_count} foto(s).")
             messagebox.showinfo("Renombrado Exitoso", f"Renombradas {renamed_count} foto(s).")
@@ -1452,23 +1742,17 @@ class EnhancedImageBrowser:
             del self.image_list[self.current_index]
 
             self.populate_folder_tree()
-            self.thumb_images_left.clear()
-            self.populate_folder_tree()
-            self.start_thumbnail_generation(
-                folder_path=self.folder_path,
-                image_list=self.image_list,
-                thumb_dict=self.thumb_images_left,
-                tree=self.folder_tree
-            )
 
             if self.image_list:
                 self.current_index = min(self.current_index, len(self.image_list) - 1)
                 self.display_image(self.current_index, fit=True)
             else:
+                self.render_scheduler.cancel()
                 self.image_canvas.delete("all")
                 self.original_image_pil = None
                 self.current_display_image_pil = None
                 self.display_image_tk = None
+                self.display_pyramid = None
                 self.update_status("No images left in the folder.")
         except Exception as e:
             self.update_status(f"Failed to delete image: {e}")
@@ -1481,9 +1765,10 @@ class EnhancedImageBrowser:
         self.status_var.set(message)
         self.root.update_idletasks()
 
-    def update_displayed_image(self, pil_img):
+    def update_displayed_image(self, pil_img, proxy_scale=1.0):
         """Convenience function to switch the current displayed image and show it."""
         self.current_display_image_pil = pil_img
+        self.display_proxy_scale = proxy_scale
         self.update_image_on_canvas(pil_img)
 
 def main():
@@ -1499,7 +1784,11 @@ def main():
 
     app = ttkb.Window(themename=initial_theme)
     EnhancedImageBrowser(app)
-    app.mainloop()
+    try:
+        app.mainloop()
+    finally:
+        # Stop the shared denoise workers before exiting
+        denoise.shutdown_pool()
 
 if __name__ == "__main__":
     main()
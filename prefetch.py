@@ -0,0 +1,92 @@
+import os
+import threading
+
+from cache import ByteLRUCache, image_nbytes
+
+
+class ImagePrefetcher:
+    """
+    Decodes images on background threads ahead of navigation and keeps the
+    results in a byte-budgeted LRU cache.
+
+    request() replaces the list of wanted paths, so positions the user has
+    jumped away from are dropped before they are decoded. load() returns a
+    cached image immediately, waits for a decode already in progress, or
+    decodes synchronously on a miss. variant is passed through to
+    decode(path, variant) and is part of the cache key (e.g. a decode scale).
+    """
+
+    def __init__(self, decode, max_bytes, workers=1):
+        self.decode = decode
+        self.cache = ByteLRUCache(max_bytes)
+        self._wanted = []
+        self._in_progress = set()
+        self._condition = threading.Condition()
+        for _ in range(workers):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def cache_key(self, path, variant=None):
+        # The stat fields catch files replaced under the same name
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (path, st.st_mtime_ns, st.st_size, variant)
+
+    def request(self, paths, variant=None):
+        """
+        Prefetch paths in priority order, discarding any earlier request.
+        """
+        with self._condition:
+            self._wanted = [(path, variant) for path in paths]
+            self._condition.notify_all()
+
+    def load(self, path, variant=None):
+        key = self.cache_key(path, variant)
+        with self._condition:
+            while key in self._in_progress:
+                self._condition.wait()
+            img = self.cache.get(key)
+            if img is not None:
+                return img
+            self._in_progress.add(key)
+        try:
+            img = self.decode(path, variant)
+            self.cache.put(key, img, image_nbytes(img))
+            return img
+        finally:
+            with self._condition:
+                self._in_progress.discard(key)
+                self._condition.notify_all()
+
+    def clear(self):
+        with self._condition:
+            self._wanted = []
+        self.cache.clear()
+
+    def _next_wanted(self):
+        while self._wanted:
+            path, variant = self._wanted.pop(0)
+            key = self.cache_key(path, variant)
+            if key is not None and key not in self._in_progress and key not in self.cache:
+                return path, variant, key
+        return None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                item = self._next_wanted()
+                while item is None:
+                    self._condition.wait()
+                    item = self._next_wanted()
+                path, variant, key = item
+                self._in_progress.add(key)
+            try:
+                img = self.decode(path, variant)
+                self.cache.put(key, img, image_nbytes(img))
+            except Exception as e:
+                print(f"Could not prefetch {path}: {e}")
+            finally:
+                with self._condition:
+                    self._in_progress.discard(key)
+                    self._condition.notify_all()
@@ -0,0 +1,51 @@
+class ImagePyramid:
+    """
+    Power-of-two mipmap levels of one image for fast zoomed display.
+
+    Level n is the base image reduced 2**n times with a box filter. Levels are
+    built lazily, each from the one above, the first time a zoom needs them.
+    resize() resamples from the smallest level that is still at least as large
+    as the target, optionally cropped to a box, so the cost follows the screen
+    size rather than the source.
+    """
+
+    def __init__(self, image):
+        self.image = image
+        self.levels = [image]
+
+    def level_for(self, scale):
+        """
+        Smallest level whose size is at least scale of the base image.
+        """
+        level = 0
+        while scale <= 0.5 ** (level + 1):
+            if level + 1 == len(self.levels):
+                above = self.levels[-1]
+                if min(above.size) < 2:
+                    break
+                self.levels.append(above.reduce(2))
+            level += 1
+        return self.levels[level]
+
+    def resize(self, size, resample, box=None):
+        """
+        Resample box (left, upper, right, lower in base image pixels, the whole
+        image by default) to size, reading from the nearest level above it.
+        """
+        w, h = self.image.size
+        if box is None:
+            box = (0, 0, w, h)
+        scale = max(size[0] / (box[2] - box[0]), size[1] / (box[3] - box[1]))
+        level = self.level_for(scale)
+        sx = level.size[0] / w
+        sy = level.size[1] / h
+        # Clamp so float rounding never reaches past the level's edge
+        level_box = (
+            max(0.0, box[0] * sx),
+            max(0.0, box[1] * sy),
+            min(level.size[0], box[2] * sx),
+            min(level.size[1], box[3] * sy)
+        )
+        if level.size == tuple(size) and level_box == (0, 0) + level.size:
+            return level
+        return level.resize(size, resample, box=level_box)
@@ -0,0 +1,67 @@
+import threading
+
+
+class RenderScheduler:
+    """
+    Runs display renders on a single background thread, latest request wins.
+
+    Every submit() bumps a generation counter. A request still waiting is
+    replaced by the newer one, a running job can poll cancelled() to stop
+    early, and results are delivered on the Tk main thread only if no newer
+    request has been made in the meantime.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.generation = 0
+        self._pending = None
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, job, on_done, on_error=None):
+        """
+        Queue job(cancelled) in place of any request still waiting.
+        on_done(result) or on_error(exception) are called on the Tk thread.
+        Returns the generation token of the request.
+        """
+        with self._condition:
+            self.generation += 1
+            self._pending = (self.generation, job, on_done, on_error)
+            self._condition.notify()
+            return self.generation
+
+    def cancel(self):
+        """
+        Drop any waiting request and supersede the one running.
+        """
+        with self._condition:
+            self.generation += 1
+            self._pending = None
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                generation, job, on_done, on_error = self._pending
+                self._pending = None
+
+            try:
+                result = job(lambda: not self.is_current(generation))
+            except Exception as e:
+                # Errors from superseded jobs (including cancellation) are dropped
+                if on_error is not None and self.is_current(generation):
+                    self.root.after(0, lambda g=generation, cb=on_error, e=e: self._deliver(g, cb, e))
+                continue
+
+            if self.is_current(generation):
+                self.root.after(0, lambda g=generation, cb=on_done, r=result: self._deliver(g, cb, r))
+
+    def _deliver(self, generation, callback, value):
+        # A newer request may have arrived while this one waited for the Tk loop
+        if self.is_current(generation):
+            callback(value)
@@ -0,0 +1,297 @@
+import io
+import os
+import sqlite3
+import threading
+from concurrent.futures import as_completed
+
+from PIL import Image, ImageOps
+
+from cache import ByteLRUCache
+from edits import ORIENTATION_TRANSPOSE
+
+THUMBNAIL_SIZE = (64, 64)
+
+# Per-folder file holding all of that folder's thumbnails
+THUMBNAIL_STORE_NAME = "miniaturas.db"
+
+# Encoded thumbnails a ThumbnailLoader keeps in memory
+THUMBNAIL_MEMORY_BYTES = 32 * 1024 * 1024
+
+# SQLite's default limit on parameters in one statement is 999
+STORE_QUERY_BATCH = 500
+
+
+def thumbnail_workers():
+    return os.cpu_count() or 1
+
+
+def create_thumbnail(source_path):
+    """
+    Small, upright thumbnail of an image file: the JPEG thumbnail embedded
+    in its EXIF block when there is one, otherwise a decode of the image.
+    """
+    try:
+        thumb = embedded_thumbnail(source_path)
+    except Exception as e:
+        print(f"Could not read the embedded thumbnail of {source_path}: {e}")
+        thumb = None
+    if thumb is None:
+        thumb = decoded_thumbnail(source_path)
+    thumb.thumbnail(THUMBNAIL_SIZE)
+    return thumb
+
+
+def decoded_thumbnail(source_path):
+    """
+    Decode the image itself, letting libjpeg work at a reduced DCT scale
+    (1/8 for camera-sized JPEGs).
+    """
+    with Image.open(source_path) as img:
+        # Must come before anything loads the pixels, or it has no effect
+        img.draft(img.mode, (THUMBNAIL_SIZE[0] * 2, THUMBNAIL_SIZE[1] * 2))
+        return ImageOps.exif_transpose(img)
+
+
+def embedded_thumbnail(source_path):
+    """
+    Upright EXIF thumbnail of an image, reading only the file header, or
+    None if there is none or it is too small. Letterbox bars that cameras
+    add to fit a 4:3 thumbnail are cropped to the image's aspect ratio.
+    """
+    with Image.open(source_path) as img:
+        exif = img.info.get("exif")
+        size = img.size
+        orientation = img.getexif().get(0x0112, 1) if exif else 1
+    if not exif or exif[:6] != b"Exif\x00\x00":
+        return None
+    data = exif_thumbnail_bytes(exif[6:])
+    if data is None:
+        return None
+
+    thumb = Image.open(io.BytesIO(data))
+    thumb.load()
+    if max(thumb.size) < max(THUMBNAIL_SIZE):
+        return None
+    tw, th = thumb.size
+    if tw * size[1] > th * size[0]:
+        keep = round(th * size[0] / size[1])
+        thumb = thumb.crop(((tw - keep) // 2, 0, (tw - keep) // 2 + keep, th))
+    elif tw * size[1] < th * size[0]:
+        keep = round(tw * size[1] / size[0])
+        thumb = thumb.crop((0, (th - keep) // 2, tw, (th - keep) // 2 + keep))
+    if orientation in ORIENTATION_TRANSPOSE:
+        thumb = thumb.transpose(ORIENTATION_TRANSPOSE[orientation])
+    return thumb
+
+
+def exif_thumbnail_bytes(tiff):
+    """
+    JPEG data referenced by IFD1 (JPEGInterchangeFormat and its length) of
+    a TIFF/EXIF block, or None.
+    """
+    if tiff[:2] == b"II":
+        byteorder = "little"
+    elif tiff[:2] == b"MM":
+        byteorder = "big"
+    else:
+        return None
+
+    def read(offset, length):
+        if offset + length > len(tiff):
+            raise ValueError("EXIF block is truncated")
+        return int.from_bytes(tiff[offset:offset + length], byteorder)
+
+    ifd0 = read(4, 4)
+    ifd1 = read(ifd0 + 2 + 12 * read(ifd0, 2), 4)
+    if not ifd1:
+        return None
+    start = length = None
+    for i in range(read(ifd1, 2)):
+        entry = ifd1 + 2 + 12 * i
+        tag = read(entry, 2)
+        if tag == 0x0201:
+            start = read(entry + 8, 4)
+        elif tag == 0x0202:
+            length = read(entry + 8, 4)
+    if not start or not length or start + length > len(tiff):
+        return None
+    data = tiff[start:start + length]
+    return data if data[:2] == b"\xff\xd8" else None
+
+
+def thumbnail_bytes(source_path):
+    """
+    create_thumbnail() encoded as a small JPEG, as kept in ThumbnailStore.
+    """
+    buffer = io.BytesIO()
+    create_thumbnail(source_path).convert("RGB").save(buffer, format="JPEG", quality=70)
+    return buffer.getvalue()
+
+
+class ThumbnailStore:
+    """
+    All the thumbnails of one folder packed in a single SQLite file, keyed
+    by file name. Each row records the source's mtime and size, so a file
+    edited under the same name no longer matches its stored thumbnail.
+    """
+
+    def __init__(self, folder_path):
+        self.path = os.path.join(folder_path, THUMBNAIL_STORE_NAME)
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails ("
+            "name TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, data BLOB)"
+        )
+
+    def load_index(self):
+        """
+        {name: (mtime_ns, size)} for every stored thumbnail, without the image data.
+        """
+        rows = self._conn.execute("SELECT name, mtime_ns, size FROM thumbnails")
+        return {name: (mtime_ns, size) for name, mtime_ns, size in rows}
+
+    def load_data(self, names):
+        """
+        {name: data} for those of names that are stored.
+        """
+        names = list(names)
+        found = {}
+        for start in range(0, len(names), STORE_QUERY_BATCH):
+            batch = names[start:start + STORE_QUERY_BATCH]
+            rows = self._conn.execute(
+                "SELECT name, data FROM thumbnails WHERE name IN (%s)" % ", ".join("?" * len(batch)),
+                batch
+            )
+            found.update(rows)
+        return found
+
+    def put_many(self, rows):
+        """
+        Store (name, mtime_ns, size, data) rows, replacing older versions.
+        """
+        with self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?)", rows)
+
+    def delete_many(self, names):
+        with self._conn:
+            self._conn.executemany("DELETE FROM thumbnails WHERE name = ?", [(name,) for name in names])
+
+    def close(self):
+        self._conn.close()
+
+
+class ThumbnailLoader:
+    """
+    Loads the thumbnails of one folder on its own thread, in the order the
+    file list asks for them.
+
+    request(names) replaces the names wanted, e.g. the rows in view first,
+    then the rows around the current photo. Each is served from memory,
+    from the folder's ThumbnailStore while the stored row still matches the
+    file's mtime and size, or else built on pool and stored, and handed to
+    deliver(name, data) on the loader thread. While nothing is wanted, the
+    thumbnails missing from the store are built in the background, without
+    delivering them, so scrolling later finds them stored.
+    """
+
+    def __init__(self, folder_path, names, pool, deliver, workers):
+        self.folder_path = folder_path
+        self.names = list(names)
+        self.pool = pool
+        self.deliver = deliver
+        self.workers = workers
+        self.cache = ByteLRUCache(THUMBNAIL_MEMORY_BYTES)
+        self._wanted = []
+        self._stopped = False
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def request(self, names):
+        with self._condition:
+            self._wanted = list(names)
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._wanted = []
+            self._condition.notify()
+
+    def _run(self):
+        try:
+            store = ThumbnailStore(self.folder_path)
+        except Exception as e:
+            print(f"Could not open the thumbnail store of {self.folder_path}: {e}")
+            return
+        try:
+            self._serve(store)
+        except Exception as e:
+            print(f"Could not update the thumbnails of {self.folder_path}: {e}")
+        finally:
+            store.close()
+
+    def _serve(self, store):
+        with os.scandir(self.folder_path) as entries:
+            stats = {entry.name: entry.stat() for entry in entries if entry.is_file()}
+        index = store.load_index()
+        gone = [name for name in index if name not in stats]
+        if gone:
+            store.delete_many(gone)
+        valid = {
+            name for name in self.names
+            if name in stats and index.get(name) == (stats[name].st_mtime_ns, stats[name].st_size)
+        }
+        missing = [name for name in self.names if name in stats and name not in valid]
+
+        while True:
+            with self._condition:
+                while not self._stopped and not self._wanted and not missing:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                # Small batches, so a newer request is picked up quickly
+                wanted = self._wanted[:self.workers]
+                self._wanted = self._wanted[self.workers:]
+            if wanted:
+                self._load(store, stats, valid, wanted, deliver=True)
+            else:
+                batch = [name for name in missing[:self.workers] if name not in valid]
+                missing = missing[self.workers:]
+                self._load(store, stats, valid, batch, deliver=False)
+
+    def _load(self, store, stats, valid, names, deliver):
+        found = {}
+        if deliver:
+            for name in names:
+                data = self.cache.get(name)
+                if data is not None:
+                    found[name] = data
+            stored = store.load_data([name for name in names if name in valid and name not in found])
+            for name, data in stored.items():
+                self.cache.put(name, data, len(data))
+            found.update(stored)
+            for name in names:
+                if name in found:
+                    self.deliver(name, found[name])
+
+        futures = {
+            self.pool.submit(thumbnail_bytes, os.path.join(self.folder_path, name)): name
+            for name in names
+            if name not in found and name in stats
+        }
+        rows = []
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                print(f"Could not generate thumbnail for {os.path.join(self.folder_path, name)}: {e}")
+                continue
+            st = stats[name]
+            rows.append((name, st.st_mtime_ns, st.st_size, data))
+            valid.add(name)
+            self.cache.put(name, data, len(data))
+            if deliver:
+                self.deliver(name, data)
+        if rows:
+            store.put_many(rows)